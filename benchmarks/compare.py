@@ -0,0 +1,60 @@
+"""Сравнивает два JSON-отчета benchmarks/run.py.
+
+    python benchmarks/compare.py old.json new.json --threshold 10
+
+Печатает изменение процентилей по каждому view и завершается с кодом 1,
+если какой-то из них вырос больше чем на --threshold процентов.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')
+
+
+def load(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+def change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--threshold', type=float, default=10.0)
+    args = parser.parse_args()
+    old, new = load(args.old), load(args.new)
+    if old['volumes'] != new['volumes']:
+        print('warning: reports were made on different data volumes')
+    print(f"{old['commit']} -> {new['commit']}")
+    regressions = []
+    for view, result in new['results'].items():
+        before = old['results'].get(view)
+        if before is None:
+            continue
+        cells = []
+        for metric in METRICS:
+            if metric not in result or metric not in before:
+                continue
+            percent = change(before[metric], result[metric])
+            cells.append(
+                f'{metric} {before[metric]} -> {result[metric]} '
+                f'({percent:+.1f}%)'
+            )
+            worse = -percent if metric == 'throughput_rps' else percent
+            if worse > args.threshold:
+                regressions.append(f'{view} {metric}')
+        print(f'{view:14}', '; '.join(cells))
+    if regressions:
+        print('regressions:', ', '.join(regressions))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+"""Нагрузочный бенчмарк view Yatube через WSGI-приложение.
+
+Запуск из корня репозитория:
+
+    python benchmarks/run.py --scale small
+    python benchmarks/run.py --scale full --requests 2000 --threads 4
+
+База для бенчмарка - отдельный файл SQLite (--database). Он заполняется
+через YatubeTestConstructor один раз и переиспользуется, пока не указан
+--reseed. Результаты пишутся в JSON (по умолчанию
+benchmarks/results/<коммит>.json), два файла сравнивает compare.py.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from time import perf_counter, time
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'yatube'))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+SCALES = {
+    'tiny': dict(
+        users=200, groups=5, posts=2_000, follows=5_000, comments=10_000),
+    'small': dict(
+        users=1_000, groups=20, posts=10_000, follows=50_000,
+        comments=100_000),
+    'medium': dict(
+        users=10_000, groups=50, posts=100_000, follows=500_000,
+        comments=1_000_000),
+    'full': dict(
+        users=100_000, groups=200, posts=1_000_000, follows=5_000_000,
+        comments=10_000_000),
+}
+VIEWS = (
+    'index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+    'add_comment',
+)
+PERCENTILES = (50, 90, 95, 99)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    parser.add_argument('--database')
+    parser.add_argument('--reseed', action='store_true')
+    parser.add_argument('--requests', type=int, default=500,
+                        help='замеряемых запросов на каждый view')
+    parser.add_argument('--warmup', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=1)
+    parser.add_argument('--cold', action='store_true',
+                        help='очищать кэш перед каждым запросом')
+    parser.add_argument('--views', nargs='+', choices=VIEWS, default=VIEWS)
+    parser.add_argument('--sessions', type=int, default=50,
+                        help='сколько пользователей залогинено')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output')
+    return parser.parse_args()
+
+
+def cache_path(database):
+    return f'{database}.cache'
+
+
+def setup_django(database):
+    import django
+    from django.conf import settings
+
+    settings.DATABASES['default']['NAME'] = database
+    # У каждой базы бенчмарка свой файл общего кэша: --cold не сбрасывает
+    # кэш сайта, а в замеры не попадают страницы, закэшированные для
+    # другой базы.
+    for options in settings.CACHES.values():
+        if options['BACKEND'] == 'core.cache.SQLiteCache':
+            options['LOCATION'] = cache_path(database)
+    settings.DEBUG = False
+    django.setup()
+
+
+def seed(scale, rng_seed):
+    from django.core.management import call_command
+    from posts.tests.utils import YatubeTestConstructor
+
+    call_command('migrate', verbosity=0)
+    constructor = YatubeTestConstructor()
+    steps = (
+        ('users', constructor.bulk_create_users, (scale['users'],)),
+        ('groups', constructor.create_groups, (scale['groups'],)),
+        ('posts', constructor.bulk_create_posts, (scale['posts'], rng_seed)),
+        ('follows', constructor.bulk_create_follows,
+         (scale['follows'], rng_seed)),
+        ('comments', constructor.bulk_create_comments,
+         (scale['comments'], rng_seed)),
+        ('counters and feeds', constructor.finish_bulk_load, ()),
+    )
+    for name, step, args in steps:
+        start = perf_counter()
+        step(*args)
+        print(f'seeded {name} in {perf_counter() - start:.1f}s')
+
+
+def wsgi_request(app, method, path, cookies, data=None):
+    """Выполняет запрос к WSGI-приложению и возвращает код ответа."""
+    path, _, query = path.partition('?')
+    body = urlencode(data).encode() if data else b''
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'HTTP_COOKIE': cookies,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+
+    def start_response(status, headers, exc_info=None):
+        statuses.append(int(status.split()[0]))
+
+    result = app(environ, start_response)
+    try:
+        for _ in result:
+            pass
+    finally:
+        if hasattr(result, 'close'):
+            result.close()
+    return statuses[0]
+
+
+class Targets:
+    """Случайные, но повторяемые адреса для каждого view."""
+
+    def __init__(self, rng, sessions):
+        from django.conf import settings
+        from django.contrib.auth import get_user_model
+        from django.middleware.csrf import get_token
+        from django.test import Client, RequestFactory
+        from posts.models import Follow, Group, Post
+
+        self.rng = rng
+        self.groups = list(Group.objects.values_list('slug', flat=True))
+        self.post_ids = list(Post.objects.values_list('id', flat=True))
+        self.authors = list(
+            Post.objects.values_list('author__username', flat=True)
+            .distinct()[:10_000]
+        )
+        request = RequestFactory().get('/')
+        self.csrf_token = get_token(request)
+        csrf_cookie = request.META['CSRF_COOKIE']
+        followers = get_user_model().objects.filter(
+            pk__in=Follow.objects.values('user')[:sessions])
+        self.cookies = []
+        for user in followers:
+            client = Client()
+            client.force_login(user)
+            session = client.cookies[settings.SESSION_COOKIE_NAME].value
+            self.cookies.append(
+                f'{settings.SESSION_COOKIE_NAME}={session}; '
+                f'{settings.CSRF_COOKIE_NAME}={csrf_cookie}'
+            )
+
+    def __call__(self, view):
+        rng = self.rng
+        if view == 'index':
+            return 'GET', '/', '', None
+        if view == 'group_posts':
+            return 'GET', f'/group/{rng.choice(self.groups)}/', '', None
+        if view == 'profile':
+            return 'GET', f'/profile/{rng.choice(self.authors)}/', '', None
+        if view == 'post_detail':
+            return 'GET', f'/posts/{rng.choice(self.post_ids)}/', '', None
+        cookies = rng.choice(self.cookies)
+        if view == 'follow_index':
+            return 'GET', '/follow/', cookies, None
+        data = {
+            'text': 'Комментарий из бенчмарка',
+            'csrfmiddlewaretoken': self.csrf_token,
+        }
+        path = f'/posts/{rng.choice(self.post_ids)}/comment/'
+        return 'POST', path, cookies, data
+
+
+def percentile(values, percent):
+    """Процентиль по ближайшему рангу для отсортированного списка."""
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[rank - 1]
+
+
+def run_view(app, targets, view, args):
+    from django.core.cache import cache
+
+    lock = threading.Lock()
+    requests = [targets(view) for _ in range(args.warmup + args.requests)]
+    for request in requests[:args.warmup]:
+        wsgi_request(app, *request)
+    durations = []
+    errors = []
+
+    def measure(request):
+        if args.cold:
+            cache.clear()
+        start = perf_counter()
+        try:
+            status = wsgi_request(app, *request)
+        except Exception as error:
+            with lock:
+                errors.append(repr(error))
+            return
+        duration = (perf_counter() - start) * 1000
+        with lock:
+            durations.append(duration)
+            if status >= 400:
+                errors.append(status)
+
+    start = perf_counter()
+    with ThreadPoolExecutor(args.threads) as executor:
+        list(executor.map(measure, requests[args.warmup:]))
+    elapsed = perf_counter() - start
+    durations.sort()
+    result = {
+        'requests': len(durations),
+        'errors': len(errors),
+        'throughput_rps': round(len(durations) / elapsed, 2),
+    }
+    if durations:
+        result['mean_ms'] = round(sum(durations) / len(durations), 3)
+        result['max_ms'] = round(durations[-1], 3)
+        for percent in PERCENTILES:
+            result[f'p{percent}_ms'] = round(
+                percentile(durations, percent), 3)
+    return result
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ('git', 'rev-parse', '--short', 'HEAD'), cwd=ROOT, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def main():
+    args = parse_args()
+    database = args.database or os.path.join(
+        tempfile.gettempdir(), f'yatube-bench-{args.scale}.sqlite3')
+    seeded = os.path.exists(database) and not args.reseed
+    if not seeded:
+        for path in (database, cache_path(database)):
+            if os.path.exists(path):
+                os.remove(path)
+    setup_django(database)
+    if not seeded:
+        seed(SCALES[args.scale], args.seed)
+
+    import django
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    app = get_wsgi_application()
+    targets = Targets(random.Random(args.seed), args.sessions)
+    results = {}
+    for view in args.views:
+        results[view] = run_view(app, targets, view, args)
+        print(view, json.dumps(results[view]))
+    commit = git_commit()
+    report = {
+        'commit': commit,
+        'time': time(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': settings.DATABASES['default']['ENGINE'],
+        'cache': settings.CACHES['default']['BACKEND'],
+        'scale': args.scale,
+        'volumes': SCALES[args.scale],
+        'options': {
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'threads': args.threads,
+            'cold': args.cold,
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = args.output or os.path.join(
+        ROOT, 'benchmarks', 'results', f'{commit}-{args.scale}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(report, file, indent=2, ensure_ascii=False)
+    print(f'results saved to {output}')
+
+
+if __name__ == '__main__':
+    main()
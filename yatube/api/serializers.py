@@ -0,0 +1,41 @@
+def serialize_post(post):
+    """Пост ленты: только поля, которые выбирает for_feed()."""
+    return {
+        'id': post.pk,
+        'text': post.text,
+        'pub_date': post.pub_date.isoformat(),
+        'author': post.author.username,
+        'group': post.group.slug if post.group_id else None,
+        'image': post.image.url if post.image else None,
+    }
+
+
+def serialize_post_detail(post):
+    return {
+        **serialize_post(post),
+        'comments_count': post.comments_count,
+    }
+
+
+def serialize_comment(comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+    }
+
+
+def serialize_post_change(post):
+    return {
+        **serialize_post_detail(post),
+        'updated_at': post.updated_at.isoformat(),
+    }
+
+
+def serialize_comment_change(comment):
+    return {
+        **serialize_comment(comment),
+        'post': comment.post_id,
+        'updated_at': comment.updated_at.isoformat(),
+    }
@@ -0,0 +1,257 @@
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.feed import rebuild_feeds
+from posts.models import Comment, Follow, Post, Profile
+from posts.tests.utils import YatubeTestConstructor
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(2)
+        test_shell.create_groups(1)
+        cls.user_1, cls.user_2 = test_shell.get_users()
+        Follow.objects.create(user=cls.user_2, author=cls.user_1)
+        test_shell.create_posts(3)
+        rebuild_feeds()
+        cls.group = test_shell.get_groups()[0]
+        cls.post = Post.objects.filter(author=cls.user_1).latest('id')
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user_2)
+
+    def test_urls(self):
+        """Адреса API отдают JSON с ETag и Last-Modified."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:group', args=(self.group.slug,)),
+            reverse('api:profile', args=(self.user_1.username,)),
+            reverse('api:post_detail', args=(self.post.pk,)),
+            reverse('api:post_comments', args=(self.post.pk,)),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertIn('ETag', response)
+                self.assertIn('Last-Modified', response)
+
+    def test_posts_shape(self):
+        """Список постов: компактные поля и курсоры страниц."""
+        data = self.guest_client.get(reverse('api:index')).json()
+        self.assertEqual(len(data['results']), Post.objects.count())
+        self.assertIsNone(data['next'])
+        self.assertEqual(set(data['results'][0]), {
+            'id', 'text', 'pub_date', 'author', 'group', 'image'})
+        data = self.guest_client.get(
+            reverse('api:post_detail', args=(self.post.pk,))).json()
+        self.assertEqual(data['id'], self.post.pk)
+        self.assertEqual(data['author'], self.user_1.username)
+        self.assertEqual(data['comments_count'], 0)
+
+    def test_not_modified_without_queries(self):
+        """Неизмененная лента отвечает 304 без запросов к БД."""
+        url = reverse('api:index')
+        response = self.guest_client.get(url)
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+        cached = self.guest_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_follow_not_modified_skips_feed(self):
+        """304 ленты подписок не строит ленту, только читает сессию."""
+        url = reverse('api:follow_index')
+        response = self.authorized_client.get(url)
+        with self.assertNumQueries(2):
+            cached = self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(cached.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_new_post_changes_etag(self):
+        """Новый пост меняет ETag ленты и профиля автора."""
+        urls = (
+            reverse('api:index'),
+            reverse('api:profile', args=(self.user_1.username,)),
+            reverse('api:follow_index'),
+        )
+        etags = {
+            url: self.authorized_client.get(url)['ETag'] for url in urls}
+        Post.objects.create(author=self.user_1, text='Новый пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+                self.assertNotEqual(response['ETag'], etags[url])
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag поста и его комментариев."""
+        urls = (
+            reverse('api:post_detail', args=(self.post.pk,)),
+            reverse('api:post_comments', args=(self.post.pk,)),
+        )
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        Comment.objects.create(
+            post=self.post, author=self.user_2, text='Комментарий')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = self.guest_client.get(urls[1]).json()
+        self.assertEqual(data['results'][0]['text'], 'Комментарий')
+
+    def test_follow_index(self):
+        """Лента подписок: 401 для гостя, посты авторов для подписчика."""
+        url = reverse('api:follow_index')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.UNAUTHORIZED)
+        data = self.authorized_client.get(url).json()
+        self.assertEqual(
+            {post['author'] for post in data['results']},
+            {self.user_1.username}
+        )
+
+    def test_not_found(self):
+        """Несуществующий пост - 404."""
+        response = self.guest_client.get(
+            reverse('api:post_detail', args=(10 ** 6,)))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+
+    def test_changes(self):
+        """Изменения после курсора: правки постов и новые комментарии."""
+        url = reverse('api:post_changes')
+        data = self.guest_client.get(url).json()
+        self.assertEqual(len(data['results']), Post.objects.count())
+        since = data['since']
+        data = self.guest_client.get(url, {'since': since}).json()
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['since'], since)
+        self.post.text = 'Правка'
+        self.post.save()
+        data = self.guest_client.get(url, {'since': since}).json()
+        self.assertEqual(
+            [post['text'] for post in data['results']], ['Правка'])
+        comment = Comment.objects.create(
+            post=self.post, author=self.user_2, text='Комментарий')
+        data = self.guest_client.get(reverse('api:comment_changes')).json()
+        self.assertEqual(data['results'][0]['id'], comment.pk)
+        self.assertEqual(data['results'][0]['post'], self.post.pk)
+
+    def test_changes_report_deletions(self):
+        """Удаленные посты и комментарии попадают в deleted."""
+        post = Post.objects.create(author=self.user_2, text='Удалить')
+        comment = Comment.objects.create(
+            post=post, author=self.user_2, text='Комментарий')
+        url = reverse('api:post_changes')
+        data = self.guest_client.get(url).json()
+        self.assertEqual(data['deleted'], [])
+        self.assertIsNone(data['deleted_since'])
+        post_id, comment_id = post.pk, comment.pk
+        post.delete()
+        data = self.guest_client.get(url).json()
+        self.assertEqual(data['deleted'], [post_id])
+        self.assertNotIn(post_id, [row['id'] for row in data['results']])
+        data = self.guest_client.get(
+            url, {'deleted_since': data['deleted_since']}).json()
+        self.assertEqual(data['deleted'], [])
+        data = self.guest_client.get(reverse('api:comment_changes')).json()
+        self.assertEqual(data['deleted'], [comment_id])
+
+    def test_changes_invalid_cursor(self):
+        """Неверный или выходящий за пределы дат курсор - 400."""
+        for name in ('since', 'deleted_since'):
+            for cursor in ('9999999999999999999999-1', 'abc'):
+                with self.subTest(name=name, cursor=cursor):
+                    response = self.guest_client.get(
+                        reverse('api:comment_changes'), {name: cursor})
+                    self.assertEqual(
+                        response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_changes_limit(self):
+        """Изменения отдаются пачками, курсор ведет к следующей."""
+        url = reverse('api:post_changes')
+        ids = []
+        since = None
+        while True:
+            params = {'limit': 2}
+            if since:
+                params['since'] = since
+            data = self.guest_client.get(url, params).json()
+            if not data['results']:
+                break
+            ids.extend(post['id'] for post in data['results'])
+            since = data['since']
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('updated_at', 'id')
+                 .values_list('id', flat=True))
+        )
+
+    def test_follow_bulk(self):
+        """Подписка списком обновляет подписки, счетчики и ленту."""
+        url = reverse('api:follow_bulk')
+        other = User.objects.create_user(username='other')
+        Post.objects.create(author=other, text='Пост другого автора')
+        Profile.objects.filter(user=other).update(followers_count=5)
+        response = self.authorized_client.post(
+            url,
+            {'follow': [self.user_1.username, 'other', 'nobody',
+                        self.user_2.username]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'followed': ['other'], 'unfollowed': []})
+        self.assertEqual(
+            Profile.objects.get(user=other).followers_count, 1)
+        self.user_2.profile.refresh_from_db()
+        self.assertEqual(self.user_2.profile.following_count, 2)
+        feed = self.authorized_client.get(reverse('api:follow_index')).json()
+        self.assertIn('other', {post['author'] for post in feed['results']})
+        response = self.authorized_client.post(
+            url,
+            {'unfollow': ['other', self.user_1.username]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.json(), {
+            'followed': [], 'unfollowed': ['HasNoName_1', 'other']})
+        self.assertFalse(Follow.objects.filter(user=self.user_2).exists())
+        self.assertEqual(
+            Profile.objects.get(user=other).followers_count, 0)
+        self.user_2.profile.refresh_from_db()
+        self.assertEqual(self.user_2.profile.following_count, 0)
+        feed = self.authorized_client.get(reverse('api:follow_index')).json()
+        self.assertEqual(feed['results'], [])
+
+    def test_follow_bulk_errors(self):
+        """Подписка списком: только POST, JSON и ограничение размера."""
+        url = reverse('api:follow_bulk')
+        self.assertEqual(
+            self.guest_client.post(url).status_code, HTTPStatus.UNAUTHORIZED)
+        self.assertEqual(
+            self.authorized_client.get(url).status_code,
+            HTTPStatus.METHOD_NOT_ALLOWED
+        )
+        for body in ('not json', {'follow': 'other'},
+                     {'follow': ['a'] * (settings.FOLLOW_BULK_LIMIT + 1)}):
+            with self.subTest(body=body):
+                response = self.authorized_client.post(
+                    url, body, content_type='application/json')
+                self.assertEqual(
+                    response.status_code, HTTPStatus.BAD_REQUEST)
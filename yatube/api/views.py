@@ -0,0 +1,160 @@
+import json
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+
+from posts.feed import get_follow_feed
+from posts.follows import follow_authors, unfollow_authors
+from posts.freshness import (comments_freshness, conditional,
+                             follow_freshness, group_freshness,
+                             index_freshness, post_freshness,
+                             profile_freshness)
+from posts.models import Comment, Group, Post, Tombstone
+from posts.utils import (KeysetPaginator, get_changes, get_comments_page,
+                         get_cursor, parse_time_cursor)
+
+from .serializers import (serialize_comment, serialize_comment_change,
+                          serialize_post, serialize_post_change,
+                          serialize_post_detail)
+
+User = get_user_model()
+
+
+def error_response(detail, status=HTTPStatus.BAD_REQUEST):
+    return JsonResponse({'detail': detail}, status=status)
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return error_response(
+                'Требуется авторизация', HTTPStatus.UNAUTHORIZED)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+def posts_response(request, posts):
+    paginator = KeysetPaginator(posts.for_feed(), settings.MAX_PAGE_AMOUNT)
+    page = paginator.get_page(
+        after=get_cursor(request, 'after'),
+        before=get_cursor(request, 'before'),
+    )
+    return JsonResponse({
+        'results': [serialize_post(post) for post in page],
+        'next': paginator.next_cursor if paginator.has_next else None,
+        'previous': (
+            paginator.previous_cursor if paginator.has_previous else None),
+    })
+
+
+@conditional(index_freshness)
+def index(request):
+    return posts_response(request, Post.objects.all())
+
+
+@conditional(group_freshness)
+def group_posts(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return posts_response(request, group.posts_of_group.all())
+
+
+@conditional(profile_freshness)
+def profile(request, username):
+    author = get_object_or_404(User, username=username)
+    return posts_response(request, author.posts_of_author.all())
+
+
+@api_login_required
+@conditional(follow_freshness)
+def follow_index(request):
+    return posts_response(request, get_follow_feed(request.user))
+
+
+@require_POST
+@api_login_required
+def follow_bulk(request):
+    """Подписка и отписка списком: {"follow": [...], "unfollow": [...]}."""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return error_response('Некорректный JSON')
+    lists = {}
+    for name in ('follow', 'unfollow'):
+        usernames = data.get(name, []) if isinstance(data, dict) else None
+        if not isinstance(usernames, list) or not all(
+            isinstance(username, str) for username in usernames
+        ):
+            return error_response(f'{name} должен быть списком логинов')
+        if len(usernames) > settings.FOLLOW_BULK_LIMIT:
+            return error_response(
+                f'Не больше {settings.FOLLOW_BULK_LIMIT} логинов в {name}')
+        lists[name] = usernames
+    return JsonResponse({
+        'followed': follow_authors(request.user, lists['follow']),
+        'unfollowed': unfollow_authors(request.user, lists['unfollow']),
+    })
+
+
+@conditional(post_freshness)
+def post_detail(request, post_id):
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'), pk=post_id)
+    return JsonResponse(serialize_post_detail(post))
+
+
+@conditional(comments_freshness)
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments, comments_next = get_comments_page(
+        post, request.GET.get('after'))
+    return JsonResponse({
+        'results': [serialize_comment(comment) for comment in comments],
+        'next': comments_next,
+    })
+
+
+def changes_response(request, queryset, serialize, kind):
+    """Измененные строки и id удаленных, у каждого списка свой курсор:
+    ``since`` и ``deleted_since``."""
+    cursors = {}
+    for name in ('since', 'deleted_since'):
+        cursors[name] = request.GET.get(name)
+        if cursors[name] and parse_time_cursor(cursors[name]) is None:
+            return error_response(f'Неверный курсор {name}')
+    limit = get_cursor(request, 'limit')
+    rows, since = get_changes(queryset, cursors['since'], limit)
+    tombstones, deleted_since = get_changes(
+        Tombstone.objects.filter(kind=kind), cursors['deleted_since'], limit)
+    return JsonResponse({
+        'results': [serialize(row) for row in rows],
+        'since': since,
+        'deleted': [tombstone.object_id for tombstone in tombstones],
+        'deleted_since': deleted_since,
+    })
+
+
+def post_changes(request):
+    """Посты, измененные после курсора ``since``, и id постов, удаленных
+    после ``deleted_since``, для синхронизации."""
+    return changes_response(
+        request,
+        Post.objects.select_related('author', 'group'),
+        serialize_post_change,
+        Tombstone.POST,
+    )
+
+
+def comment_changes(request):
+    """Комментарии, измененные после курсора ``since``."""
+    return changes_response(
+        request,
+        Comment.objects.select_related('author'),
+        serialize_comment_change,
+        Tombstone.COMMENT,
+    )
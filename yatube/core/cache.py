@@ -0,0 +1,268 @@
+import os
+import pickle
+import sqlite3
+import threading
+from random import random
+from time import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.utils.functional import cached_property
+
+MISSING = object()
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в отдельном файле SQLite, общий для всех процессов сервера.
+
+    LOCATION - путь к файлу. Соединения открываются отдельно в каждом
+    потоке и процессе, журнал WAL позволяет читать параллельно с записью.
+    """
+    CREATE_TABLE = (
+        'CREATE TABLE IF NOT EXISTS cache ('
+        'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+    )
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        self._local = threading.local()
+
+    @property
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(self.CREATE_TABLE)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _get_many(self, keys):
+        if not keys:
+            return {}
+        rows = self._connection.execute(
+            'SELECT key, value FROM cache WHERE key IN ({}) '
+            'AND (expires IS NULL OR expires > ?)'.format(
+                ', '.join('?' * len(keys))
+            ),
+            (*keys, time())
+        )
+        return {key: pickle.loads(value) for key, value in rows}
+
+    def _write(self, sql, rows):
+        self._connection.executemany(sql, rows)
+        if random() < 1 / self._cull_frequency:
+            self._cull()
+
+    def _cull(self):
+        connection = self._connection
+        connection.execute('DELETE FROM cache WHERE expires <= ?', (time(),))
+        count, = connection.execute('SELECT COUNT(*) FROM cache').fetchone()
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache WHERE rowid IN '
+                '(SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+    def _dumps(self, value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        self._connection.execute(
+            'DELETE FROM cache WHERE key = ? AND expires <= ?',
+            (key, time())
+        )
+        cursor = self._connection.execute(
+            'INSERT OR IGNORE INTO cache VALUES (?, ?, ?)',
+            (key, self._dumps(value), self.get_backend_timeout(timeout))
+        )
+        return cursor.rowcount == 1
+
+    def get(self, key, default=None, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return self._get_many([key]).get(key, default)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        cursor = self._connection.execute(
+            'UPDATE cache SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time())
+        )
+        return cursor.rowcount == 1
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version)
+
+    def get_many(self, keys, version=None):
+        made_keys = {self.make_key(key, version=version): key for key in keys}
+        for key in made_keys:
+            self.validate_key(key)
+        return {
+            made_keys[key]: value
+            for key, value in self._get_many(list(made_keys)).items()
+        }
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = []
+        for key, value in data.items():
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key, self._dumps(value), expires))
+        self._write('INSERT OR REPLACE INTO cache VALUES (?, ?, ?)', rows)
+        return []
+
+    def delete_many(self, keys, version=None):
+        rows = []
+        for key in keys:
+            key = self.make_key(key, version=version)
+            self.validate_key(key)
+            rows.append((key,))
+        self._connection.executemany('DELETE FROM cache WHERE key = ?', rows)
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_key(key, version=version)
+        self.validate_key(made_key)
+        with self._connection:
+            self._connection.execute('BEGIN IMMEDIATE')
+            value = self._get_many([made_key]).get(made_key, MISSING)
+            if value is MISSING:
+                raise ValueError("Key '%s' not found" % key)
+            value += delta
+            self._connection.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), made_key)
+            )
+        return value
+
+    def clear(self):
+        self._connection.execute('DELETE FROM cache')
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: локальный L1 перед общим для процессов L2.
+
+    OPTIONS:
+        LOCAL - алиас кэша L1 (обычно LocMemCache);
+        SHARED - алиас общего кэша L2;
+        LOCAL_KEY_PREFIXES - префиксы ключей, которые держатся в L1.
+            Это должны быть неизменяемые записи (ключи с версией внутри),
+            потому что L1 одного процесса не узнает об изменениях в
+            другом. Счетчики, версии и блокировки читаются только из L2;
+        LOCAL_TIMEOUT - время жизни записей в L1.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._local_alias = options['LOCAL']
+        self._shared_alias = options['SHARED']
+        self._local_prefixes = tuple(options.get('LOCAL_KEY_PREFIXES', ()))
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+
+    @cached_property
+    def local(self):
+        return caches[self._local_alias]
+
+    @cached_property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return key.startswith(self._local_prefixes)
+
+    def _local_timeout_for(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        if expires is None:
+            return self._local_timeout
+        return max(0, min(expires - time(), self._local_timeout))
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added and self._is_local(key):
+            self.local.set(
+                key, value, self._local_timeout_for(timeout), version)
+        return added
+
+    def get(self, key, default=None, version=None):
+        if not self._is_local(key):
+            return self.shared.get(key, default, version)
+        value = self.local.get(key, MISSING, version)
+        if value is MISSING:
+            value = self.shared.get(key, MISSING, version)
+            if value is MISSING:
+                return default
+            self.local.set(key, value, self._local_timeout, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        if self._is_local(key):
+            self.local.set(
+                key, value, self._local_timeout_for(timeout), version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self.local.delete(key, version)
+        self.shared.delete(key, version)
+
+    def get_many(self, keys, version=None):
+        local_keys = [key for key in keys if self._is_local(key)]
+        found = self.local.get_many(local_keys, version)
+        missing = [key for key in keys if key not in found]
+        shared_found = self.shared.get_many(missing, version)
+        self.local.set_many(
+            {
+                key: value for key, value in shared_found.items()
+                if self._is_local(key)
+            },
+            self._local_timeout,
+            version
+        )
+        found.update(shared_found)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        self.local.set_many(
+            {
+                key: value for key, value in data.items()
+                if self._is_local(key) and key not in failed
+            },
+            self._local_timeout_for(timeout),
+            version
+        )
+        return failed
+
+    def delete_many(self, keys, version=None):
+        self.local.delete_many(keys, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def incr(self, key, delta=1, version=None):
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
@@ -0,0 +1,48 @@
+import multiprocessing
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.tasks import work
+
+
+class Command(BaseCommand):
+    help = (
+        'Запускает пул воркеров очереди задач. Каждый воркер - отдельный '
+        'процесс, задачи между ними делит таблица Task'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=settings.TASKS_WORKERS,
+            help='число процессов'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='выполнить готовые задачи и выйти'
+        )
+
+    def handle(self, *args, **options):
+        workers = max(options['workers'], 1)
+        burst = options['burst']
+        if workers == 1:
+            work(burst)
+            self.stdout.write(self.style.SUCCESS('Очередь обработана'))
+            return
+        # Дочерние процессы открывают свои соединения с БД.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=work, args=(burst,), daemon=True)
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS('Очередь обработана'))
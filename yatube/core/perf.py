@@ -0,0 +1,185 @@
+import json
+import logging
+import threading
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from random import random
+from time import perf_counter, time
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('yatube.perf')
+
+_local = threading.local()
+_lock = threading.Lock()
+_buffer = None
+
+FIELDS = (
+    'db_queries', 'db_ms', 'template_ms',
+    'cache_hits', 'cache_misses', 'thumbnail_ms',
+)
+
+
+def get_buffer():
+    """Кольцевой буфер последних замеров этого процесса."""
+    global _buffer
+    if _buffer is None:
+        _buffer = deque(maxlen=settings.PERF_BUFFER_SIZE)
+    return _buffer
+
+
+def get_records():
+    with _lock:
+        return list(get_buffer())
+
+
+def current():
+    """Замер текущего запроса или None, если запрос не попал в выборку."""
+    return getattr(_local, 'record', None)
+
+
+def count(name, amount=1):
+    record = current()
+    if record is not None:
+        record[name] += amount
+
+
+def count_cache(hit):
+    count('cache_hits' if hit else 'cache_misses')
+
+
+@contextmanager
+def timer(name):
+    """Добавляет время блока в миллисекундах к полю ``name`` замера.
+
+    Вложенные блоки с тем же именем не считаются повторно: include
+    и post_card рендерятся внутри страницы, время которой уже идет.
+    """
+    record = current()
+    if record is None or name in _local.running:
+        yield
+        return
+    _local.running.add(name)
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        record[name] += (perf_counter() - start) * 1000
+        _local.running.discard(name)
+
+
+def query_timer(execute, sql, params, many, context):
+    start = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        count('db_queries')
+        count('db_ms', (perf_counter() - start) * 1000)
+
+
+def should_record(request):
+    return (
+        random() < settings.PERF_SAMPLE_RATE
+        and not request.path.startswith(settings.PERF_EXCLUDE_PATHS)
+    )
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.func.__module__.startswith(
+        settings.PERF_VIEW_MODULES
+    ):
+        return None
+    return match.view_name
+
+
+def save(request, response, record, elapsed):
+    name = view_name(request)
+    if name is None:
+        return
+    entry = {
+        'time': time(),
+        'view': name,
+        'method': request.method,
+        'path': request.path,
+        'status': response.status_code,
+        'total_ms': round(elapsed, 3),
+        **{field: round(record[field], 3) for field in FIELDS},
+    }
+    with _lock:
+        get_buffer().append(entry)
+    logger.info(json.dumps(entry, ensure_ascii=False))
+
+
+class PerfMiddleware:
+    """Замеряет выборку запросов к view из PERF_VIEW_MODULES.
+
+    Для каждого запроса из выборки (PERF_SAMPLE_RATE) считаются запросы
+    к БД и их время, время рендеринга шаблонов, попадания и промахи
+    кэша и время создания миниатюр. Замеры попадают в кольцевой буфер,
+    который показывает /debug/perf/, и в лог ``yatube.perf`` строкой
+    JSON. Запросы вне выборки стоят одного вызова random().
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_record(request):
+            return self.get_response(request)
+        _local.record = dict.fromkeys(FIELDS, 0)
+        _local.running = set()
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(query_timer))
+                response = self.get_response(request)
+            save(
+                request,
+                response,
+                _local.record,
+                (perf_counter() - start) * 1000
+            )
+        finally:
+            _local.record = None
+        return response
+
+
+class InstrumentedTemplate(Template):
+    def render(self, context=None, request=None):
+        with timer('template_ms'):
+            return super().render(context, request)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Движок шаблонов Django, который замеряет время рендеринга."""
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        return InstrumentedTemplate(template.template, self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+def summarize(records):
+    """Сводка по view: число замеров и средние значения полей."""
+    fields = ('total_ms', *FIELDS)
+    views = {}
+    for record in records:
+        view = views.setdefault(
+            record['view'], {'view': record['view'], 'count': 0,
+                             'max_ms': 0.0, **dict.fromkeys(fields, 0.0)})
+        view['count'] += 1
+        view['max_ms'] = max(view['max_ms'], record['total_ms'])
+        for field in fields:
+            view[field] += record[field]
+    for view in views.values():
+        for field in fields:
+            view[field] = round(view[field] / view['count'], 2)
+    return sorted(views.values(), key=lambda view: -view['total_ms'])
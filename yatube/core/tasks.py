@@ -0,0 +1,187 @@
+"""Очередь фоновых задач в таблице Task.
+
+Задача - функция, зарегистрированная декоратором @task под постоянным
+именем. enqueue() добавляет строку в текущей транзакции: воркер увидит
+задачу только после коммита, а откат отменит ее вместе с данными.
+
+Воркеры (manage.py run_tasks) берут задачи по убыванию приоритета и
+времени запуска. SQLite не умеет SELECT ... FOR UPDATE SKIP LOCKED,
+поэтому задача захватывается условным UPDATE по состоянию: из
+нескольких воркеров строку обновит только один. Упавшая задача
+повторяется с экспоненциальной задержкой до max_attempts раз. Задача с
+ключом идемпотентности ставится в очередь один раз, пока ее строка не
+удалена purge_tasks(); задача с тем же ключом, исчерпавшая попытки,
+ставится заново. Упавшие задачи тоже удаляются, но хранятся дольше,
+чтобы их ошибки можно было разобрать. После сбоя воркера задача
+выполняется повторно.
+"""
+import json
+import logging
+import traceback
+from datetime import timedelta
+from time import sleep
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+CLAIM_CANDIDATES = 10
+
+
+def task(name, priority=0, max_attempts=None, on_failure=None):
+    """Регистрирует функцию как задачу ``name``.
+
+    Аргументы задачи сохраняются в JSON, поэтому передаются id и
+    строки, а не объекты моделей. ``on_failure`` вызывается с теми же
+    аргументами, когда задача исчерпала попытки.
+    """
+    def decorator(function):
+        TASKS[name] = (function, priority, max_attempts, on_failure)
+        return function
+    return decorator
+
+
+def enqueue(name, *args, key=None, priority=None, countdown=0):
+    """Ставит задачу в очередь и возвращает ее строку Task.
+
+    Если задача с ключом ``key`` уже есть, возвращается она.
+    """
+    _, default_priority, max_attempts, _ = TASKS[name]
+    fields = {
+        'name': name,
+        'arguments': json.dumps(args),
+        'priority': default_priority if priority is None else priority,
+        'max_attempts': max_attempts or settings.TASKS_MAX_ATTEMPTS,
+        'run_at': timezone.now() + timedelta(seconds=countdown),
+    }
+    if key is None:
+        return Task.objects.create(**fields)
+    task, created = Task.objects.get_or_create(key=key, defaults=fields)
+    if not created and task.status == Task.FAILED:
+        Task.objects.filter(pk=task.pk, status=Task.FAILED).update(
+            status=Task.QUEUED, attempts=0, finished=None, **fields)
+        task.refresh_from_db()
+    return task
+
+
+def fail(task, error):
+    """Отмечает задачу упавшей и вызывает ее on_failure."""
+    Task.objects.filter(pk=task.pk).update(
+        status=Task.FAILED,
+        locked_until=None,
+        finished=timezone.now(),
+        last_error=error,
+    )
+    on_failure = TASKS.get(task.name, (None,) * 4)[3]
+    if on_failure is None:
+        return
+    try:
+        on_failure(*json.loads(task.arguments))
+    except Exception:
+        logger.exception('Обработчик ошибки задачи %s (%s) упал',
+                         task.name, task.pk)
+
+
+def claim():
+    """Захватывает самую срочную задачу из готовых к запуску."""
+    now = timezone.now()
+    queued = Task.objects.filter(status=Task.QUEUED, run_at__lte=now)
+    candidates = queued.order_by('-priority', 'run_at').values_list(
+        'pk', flat=True)[:CLAIM_CANDIDATES]
+    for pk in candidates:
+        claimed = queued.filter(pk=pk).update(
+            status=Task.RUNNING,
+            attempts=F('attempts') + 1,
+            locked_until=now + timedelta(seconds=settings.TASKS_LOCK_TIMEOUT),
+        )
+        if claimed:
+            return Task.objects.get(pk=pk)
+    return None
+
+
+def run_task(task):
+    """Выполняет захваченную задачу, возвращает True при успехе.
+
+    Задача не оборачивается в транзакцию: в SQLite транзакция, которая
+    сначала читает, а потом пишет, сразу падает с «database is locked»,
+    если пишет другой воркер. Поэтому задачи должны быть идемпотентными.
+    """
+    tasks = Task.objects.filter(pk=task.pk)
+    try:
+        TASKS[task.name][0](*json.loads(task.arguments))
+    except Exception:
+        logger.exception('Задача %s (%s) завершилась ошибкой',
+                         task.name, task.pk)
+        error = traceback.format_exc()
+        if task.attempts >= task.max_attempts:
+            fail(task, error)
+            return False
+        delay = settings.TASKS_RETRY_DELAY * 2 ** (task.attempts - 1)
+        tasks.update(
+            status=Task.QUEUED,
+            run_at=timezone.now() + timedelta(seconds=delay),
+            locked_until=None,
+            last_error=error,
+        )
+        return False
+    tasks.update(
+        status=Task.DONE, locked_until=None, finished=timezone.now())
+    return True
+
+
+def run_pending(limit=None):
+    """Выполняет готовые задачи в текущем процессе, возвращает их число."""
+    done = 0
+    while limit is None or done < limit:
+        task = claim()
+        if task is None:
+            break
+        run_task(task)
+        done += 1
+    return done
+
+
+def requeue_stale():
+    """Возвращает в очередь задачи воркеров, которые не успели их
+    выполнить за TASKS_LOCK_TIMEOUT, например, из-за падения процесса."""
+    error = 'Превышено время выполнения'
+    stale = Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=timezone.now())
+    for task in stale.filter(attempts__gte=F('max_attempts')):
+        fail(task, error)
+    return stale.filter(attempts__lt=F('max_attempts')).update(
+        status=Task.QUEUED,
+        locked_until=None,
+        last_error=error,
+    )
+
+
+def purge_tasks():
+    """Удаляет выполненные задачи старше TASKS_KEEP_DONE секунд и
+    упавшие старше TASKS_KEEP_FAILED."""
+    now = timezone.now()
+    return Task.objects.filter(
+        Q(status=Task.DONE,
+          finished__lt=now - timedelta(seconds=settings.TASKS_KEEP_DONE))
+        | Q(status=Task.FAILED,
+            finished__lt=now - timedelta(seconds=settings.TASKS_KEEP_FAILED))
+    ).delete()[0]
+
+
+def work(burst=False):
+    """Цикл воркера. Пустая очередь опрашивается раз в
+    TASKS_POLL_INTERVAL секунд, с ``burst`` воркер выходит из цикла."""
+    while True:
+        requeue_stale()
+        if run_pending(settings.TASKS_BATCH_SIZE):
+            continue
+        if burst:
+            return
+        purge_tasks()
+        sleep(settings.TASKS_POLL_INTERVAL)
@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+from time import sleep
+
+from django.core.cache import caches
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import SQLiteCache
+
+TEMP_CACHE_DIR = tempfile.mkdtemp()
+CACHE_PATH = os.path.join(TEMP_CACHE_DIR, 'cache.sqlite3')
+
+
+def write_from_other_process(path):
+    SQLiteCache(path, {}).set('from_child', 'значение')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'LOCAL': 'local',
+            'SHARED': 'shared',
+            'LOCAL_KEY_PREFIXES': ('immutable:',),
+        },
+    },
+    'local': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'test-local',
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': CACHE_PATH,
+    },
+})
+class CacheBackendsTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_CACHE_DIR, ignore_errors=True)
+
+    def setUp(self):
+        self.cache = caches['default']
+        self.shared = caches['shared']
+        self.cache.clear()
+
+    def test_sqlite_cache_operations(self):
+        """SQLiteCache поддерживает операции кэша Django"""
+        self.assertTrue(self.shared.add('key', 1))
+        self.assertFalse(self.shared.add('key', 2))
+        self.assertEqual(self.shared.incr('key', 5), 6)
+        self.shared.set_many({'a': [1, 2], 'b': 'текст'})
+        self.assertEqual(
+            self.shared.get_many(['a', 'b', 'c']),
+            {'a': [1, 2], 'b': 'текст'}
+        )
+        self.shared.delete('a')
+        self.assertIsNone(self.shared.get('a'))
+        with self.assertRaises(ValueError):
+            self.shared.incr('missing')
+
+    def test_sqlite_cache_expiry(self):
+        """Истекшие записи не читаются и могут быть добавлены заново"""
+        self.shared.set('key', 'value', 0.1)
+        sleep(0.2)
+        self.assertIsNone(self.shared.get('key'))
+        self.assertTrue(self.shared.add('key', 'new'))
+
+    def test_sqlite_cache_is_shared_between_processes(self):
+        """Запись из другого процесса видна в текущем"""
+        process = multiprocessing.get_context('fork').Process(
+            target=write_from_other_process, args=(CACHE_PATH,)
+        )
+        process.start()
+        process.join()
+        self.assertEqual(self.shared.get('from_child'), 'значение')
+
+    def test_tiered_cache_layers(self):
+        """Неизменяемые ключи читаются из L1, остальные всегда из L2"""
+        self.cache.set('immutable:card', 'v1')
+        self.cache.set('version:post:1', 'v1')
+        self.shared.set('immutable:card', 'v2')
+        self.shared.set('version:post:1', 'v2')
+        self.assertEqual(self.cache.get('immutable:card'), 'v1')
+        self.assertEqual(self.cache.get('version:post:1'), 'v2')
+        self.assertEqual(
+            self.cache.get_many(['immutable:card', 'version:post:1']),
+            {'immutable:card': 'v1', 'version:post:1': 'v2'}
+        )
+        caches['local'].clear()
+        self.assertEqual(self.cache.get('immutable:card'), 'v2')
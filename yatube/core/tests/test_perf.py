@@ -0,0 +1,62 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.tests.utils import YatubeTestConstructor
+
+from ..perf import get_buffer, get_records
+
+User = get_user_model()
+
+
+@override_settings(PERF_SAMPLE_RATE=1)
+class PerfMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(1)
+        test_shell.create_posts(3)
+        cls.staff = User.objects.create_user(
+            username='staff', is_staff=True)
+
+    def setUp(self):
+        self.guest_client = Client()
+        get_buffer().clear()
+        cache.clear()
+
+    def test_request_is_measured(self):
+        """Замер содержит запросы к БД, шаблоны и кэш"""
+        with self.assertLogs('yatube.perf', 'INFO') as logs:
+            self.guest_client.get(reverse('posts:index'))
+            self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(len(logs.records), 2)
+        first, second = get_records()
+        self.assertEqual(first['view'], 'posts:index')
+        self.assertEqual(first['status'], HTTPStatus.OK)
+        self.assertGreater(first['db_queries'], 0)
+        self.assertGreater(first['template_ms'], 0)
+        self.assertGreater(first['cache_misses'], 0)
+        self.assertEqual(second['cache_hits'], 1)
+        self.assertEqual(second['template_ms'], 0)
+
+    @override_settings(PERF_SAMPLE_RATE=0)
+    def test_request_outside_sample(self):
+        """Запросы вне выборки не замеряются"""
+        self.guest_client.get(reverse('posts:index'))
+        self.assertEqual(get_records(), [])
+
+    def test_perf_report_for_staff(self):
+        """Страница замеров доступна только персоналу"""
+        url = reverse('perf_report')
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.FOUND)
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.force_login(self.staff)
+        response = self.guest_client.get(url)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertContains(response, 'posts:index')
+        self.assertEqual(len(get_records()), 1)
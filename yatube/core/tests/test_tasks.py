@@ -0,0 +1,200 @@
+import json
+import re
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.db import transaction
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.feed import get_follow_feed
+from posts.models import Follow, Post
+
+from ..models import Task
+from ..tasks import (TASKS, enqueue, purge_tasks, requeue_stale, run_pending,
+                     task)
+
+User = get_user_model()
+
+calls = []
+
+
+@task('tests.record', priority=1)
+def record(value):
+    calls.append(value)
+
+
+def give_up(value):
+    calls.append(f'failed {value}')
+
+
+@task('tests.flaky', max_attempts=2, on_failure=give_up)
+def flaky(value):
+    calls.append(value)
+    raise ValueError(value)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        TASKS.pop('tests.record')
+        TASKS.pop('tests.flaky')
+
+    def test_priority_order(self):
+        """Задачи выполняются по убыванию приоритета"""
+        enqueue('tests.record', 'low')
+        enqueue('tests.record', 'high', priority=10)
+        enqueue('tests.record', 'default')
+        self.assertEqual(run_pending(), 3)
+        self.assertEqual(calls, ['high', 'low', 'default'])
+        self.assertFalse(Task.objects.exclude(status=Task.DONE).exists())
+
+    def test_idempotency_key(self):
+        """Задача с тем же ключом ставится в очередь один раз"""
+        first = enqueue('tests.record', 1, key='once')
+        second = enqueue('tests.record', 2, key='once')
+        self.assertEqual(first.pk, second.pk)
+        run_pending()
+        enqueue('tests.record', 3, key='once')
+        run_pending()
+        self.assertEqual(calls, [1])
+
+    def test_countdown(self):
+        """Отложенная задача не запускается раньше срока"""
+        enqueue('tests.record', 'later', countdown=60)
+        self.assertEqual(run_pending(), 0)
+        Task.objects.update(run_at=timezone.now())
+        self.assertEqual(run_pending(), 1)
+
+    def test_retries(self):
+        """Упавшая задача повторяется с задержкой до max_attempts раз"""
+        queued = enqueue('tests.flaky', 'boom')
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('ValueError', queued.last_error)
+        Task.objects.update(run_at=timezone.now())
+        with self.assertLogs('core.tasks', 'ERROR'):
+            run_pending()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertEqual(queued.attempts, 2)
+        self.assertEqual(calls, ['boom', 'boom', 'failed boom'])
+
+    def test_failed_key_can_be_enqueued_again(self):
+        """Задачу с ключом, исчерпавшую попытки, можно поставить снова"""
+        failed = enqueue('tests.flaky', 'first', key='retry')
+        Task.objects.filter(pk=failed.pk).update(status=Task.FAILED)
+        queued = enqueue('tests.flaky', 'second', key='retry')
+        self.assertEqual(queued.pk, failed.pk)
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertEqual(queued.attempts, 0)
+        self.assertEqual(queued.arguments, '["second"]')
+
+    def test_stale_and_purge(self):
+        """Зависшие задачи возвращаются в очередь, старые выполненные
+        и упавшие удаляются"""
+        stale = enqueue('tests.record', 'stale')
+        Task.objects.filter(pk=stale.pk).update(
+            status=Task.RUNNING,
+            attempts=1,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        exhausted = enqueue('tests.flaky', 'stale')
+        Task.objects.filter(pk=exhausted.pk).update(
+            status=Task.RUNNING,
+            attempts=2,
+            locked_until=timezone.now() - timedelta(seconds=1),
+        )
+        self.assertEqual(requeue_stale(), 1)
+        self.assertEqual(
+            Task.objects.get(pk=exhausted.pk).status, Task.FAILED)
+        run_pending()
+        self.assertEqual(calls, ['failed stale', 'stale'])
+        Task.objects.update(finished=timezone.now() - timedelta(days=2))
+        self.assertEqual(purge_tasks(), 1)
+        self.assertTrue(Task.objects.filter(pk=exhausted.pk).exists())
+        Task.objects.update(finished=timezone.now() - timedelta(days=8))
+        self.assertEqual(purge_tasks(), 1)
+        self.assertFalse(Task.objects.exists())
+
+    def test_run_tasks_command(self):
+        """Команда run_tasks --burst выполняет очередь и выходит"""
+        enqueue('tests.record', 'command')
+        call_command('run_tasks', workers=1, burst=True, stdout=StringIO())
+        self.assertEqual(calls, ['command'])
+
+    def test_rollback_drops_task(self):
+        """Задача откатывается вместе с транзакцией"""
+        try:
+            with transaction.atomic():
+                enqueue('tests.record', 'rolled back')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertFalse(Task.objects.exists())
+
+
+class DeferredWorkTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='password')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def test_password_reset_email_is_queued(self):
+        """Письмо для сброса пароля отправляет задача очереди"""
+        response = Client().post(
+            reverse('auth:password_reset_form'),
+            {'email': 'reader@example.com'},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        arguments = json.loads(Task.objects.get().arguments)
+        self.assertEqual(arguments[0], self.reader.pk)
+        self.assertNotIn('://', json.dumps(arguments))
+        self.assertEqual(run_pending(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['reader@example.com'])
+        link = re.search(r'https?://\S+', mail.outbox[0].body).group()
+        response = Client().get(link, follow=True)
+        self.assertTrue(response.context['validlink'])
+
+    def test_failed_renditions_clear_pending(self):
+        """Если миниатюры не создались, пост не ждет их вечно"""
+        post = Post.objects.create(
+            author=self.author, text='Пост', thumbnails_pending=True)
+        queued = enqueue(
+            'posts.renditions', post.pk, 'posts/missing.gif', key='missing')
+        Task.objects.filter(pk=queued.pk).update(max_attempts=1)
+        with mock.patch('posts.thumbnails.generate_renditions',
+                        side_effect=OSError):
+            with self.assertLogs('core.tasks', 'ERROR'):
+                run_pending()
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnails_pending)
+        self.assertEqual(Task.objects.get(pk=queued.pk).status, Task.FAILED)
+
+    @override_settings(FOLLOW_FEED_INLINE_FANOUT=0)
+    def test_large_fan_out_is_queued(self):
+        """Рассылка поста автора с многими подписчиками идет через
+        очередь"""
+        post = Post.objects.create(author=self.author, text='Пост')
+        self.assertNotIn(post, get_follow_feed(self.reader))
+        self.assertTrue(
+            Task.objects.filter(key=f'fan_out:{post.pk}').exists())
+        run_pending()
+        self.assertIn(post, get_follow_feed(self.reader))
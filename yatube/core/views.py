@@ -1,7 +1,10 @@
 from http import HTTPStatus
 
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from .perf import get_records, summarize
+
 
 def page_not_found(request, exception):
     return render(
@@ -26,3 +29,13 @@ def server_error(request):
         'core/500.html',
         status=HTTPStatus.INTERNAL_SERVER_ERROR
     )
+
+
+@staff_member_required
+def perf_report(request):
+    records = get_records()
+    context = {
+        'views': summarize(records),
+        'records': records[::-1],
+    }
+    return render(request, 'core/perf.html', context)
@@ -0,0 +1,149 @@
+from functools import wraps
+from hashlib import md5
+from http import HTTPStatus
+from math import log
+from random import random
+from time import time
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from core.perf import count_cache
+
+VERSION_KEY = 'version:{}:{}'
+POST_CARD_KEY = 'post_card:{}:{}:{}:{}:{}'
+FEED_PAGE_KEY = 'feed_page:{}:{}:{}'
+FEED_STALE_KEY = 'feed_stale:{}:{}'
+FEED_LOCK_KEY = 'feed_lock:{}'
+
+
+def new_version():
+    return uuid4().hex[:12]
+
+
+def get_versions(*objects):
+    """Возвращает версии объектов, заводя недостающие.
+
+    Версия - случайная строка, а не счетчик: если ключ версии вытеснен
+    из кэша, новая версия не совпадет со старой и устаревшие фрагменты
+    больше не будут прочитаны.
+    """
+    keys = [VERSION_KEY.format(*obj) for obj in objects]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, new_version(), None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump_version(name, pk):
+    cache.set(VERSION_KEY.format(name, pk), new_version(), None)
+
+
+def post_card_key(post, variant=''):
+    post_version, group_version, author_version = get_versions(
+        ('post', post.pk),
+        ('group', post.group_id),
+        ('user', post.author_id),
+    )
+    return POST_CARD_KEY.format(
+        post.pk,
+        post_version,
+        group_version,
+        author_version,
+        md5(variant.encode()).hexdigest(),
+    )
+
+
+def bump_feeds(*feeds):
+    cache.set_many(
+        {VERSION_KEY.format('feed', feed): new_version() for feed in feeds},
+        None
+    )
+
+
+def should_refresh_early(entry):
+    """Вероятностное раннее обновление (XFetch).
+
+    Чем ближе истечение записи и чем дольше ее пересчет, тем выше
+    шанс, что один из запросов обновит ее заранее, и записи не
+    истекают у всех запросов одновременно.
+    """
+    return (
+        time() - entry['delta'] * settings.FEED_CACHE_BETA * log(random())
+        >= entry['expires']
+    )
+
+
+def cached_response(entry):
+    response = HttpResponse(
+        entry['content'],
+        content_type=entry['content_type']
+    )
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def cache_feed(*feeds):
+    """Кэширует страницу ленты до смены поколения любой из лент.
+
+    ``feeds`` - шаблоны имен лент, которые подставляются аргументами
+    view и ``user``, например ``'group:{slug}'``. Поколения меняют сигналы в
+    posts.signals, поэтому TTL страниц может быть долгим. Пересчет
+    страницы выполняет один запрос, остальные в это время получают
+    последнюю версию страницы.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            generations = get_versions(
+                ('feed', 'all'),
+                *(
+                    ('feed', feed.format(user=request.user, **kwargs))
+                    for feed in feeds
+                )
+            )
+            user_id = request.user.pk or 0
+            path = md5(request.get_full_path().encode()).hexdigest()
+            key = FEED_PAGE_KEY.format(
+                md5(':'.join(generations).encode()).hexdigest(),
+                user_id,
+                path
+            )
+            stale_key = FEED_STALE_KEY.format(user_id, path)
+            entry = cache.get(key)
+            count_cache(entry is not None)
+            if entry is not None and not should_refresh_early(entry):
+                return cached_response(entry)
+            lock_key = FEED_LOCK_KEY.format(key)
+            locked = cache.add(lock_key, 1, settings.FEED_CACHE_LOCK_TIMEOUT)
+            if not locked:
+                entry = entry or cache.get(stale_key)
+                if entry is not None:
+                    return cached_response(entry)
+            try:
+                started = time()
+                response = view(request, *args, **kwargs)
+                if response.status_code == HTTPStatus.OK:
+                    entry = {
+                        'content': response.content,
+                        'content_type': response['Content-Type'],
+                        'expires': time() + settings.FEED_CACHE_TIMEOUT,
+                        'delta': time() - started,
+                    }
+                    cache.set_many(
+                        {key: entry, stale_key: entry},
+                        settings.FEED_CACHE_TIMEOUT
+                    )
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
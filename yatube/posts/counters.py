@@ -0,0 +1,161 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import (Comment, Follow, Group, GroupAuthor, GroupStats, Post,
+                     Profile)
+
+User = get_user_model()
+
+
+def change_post_counter(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=Greatest(F('comments_count') + delta, 0)
+    )
+
+
+def change_profile_counter(user_id, field, delta):
+    Profile.objects.filter(user_id=user_id).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+def latest(field, moment):
+    """Большее из поля и ``moment``, если поле еще пустое - ``moment``."""
+    moment = Value(moment)
+    return Coalesce(Greatest(F(field), moment), moment)
+
+
+def change_group_stats(group_id, **fields):
+    stats = GroupStats.objects.filter(group_id=group_id)
+    if not stats.update(**fields):
+        GroupStats.objects.get_or_create(group_id=group_id)
+        stats.update(**fields)
+
+
+def change_group_counters(group_id, author_id, delta, moment=None):
+    """Меняет число постов группы на ``delta`` и пересчитывает авторов.
+
+    Число постов автора в группе хранится в GroupAuthor, authors_count -
+    число таких строк. Оно пересчитывается подзапросом, а не сдвигается:
+    при удалении пользователя каскад удаляет его строки GroupAuthor
+    раньше постов, и сдвиг по удаленным строкам потерял бы автора.
+    """
+    if group_id is None:
+        return
+    authors = GroupAuthor.objects.filter(
+        group_id=group_id, author_id=author_id)
+    if delta > 0:
+        GroupAuthor.objects.get_or_create(
+            group_id=group_id, author_id=author_id)
+        authors.update(posts_count=F('posts_count') + delta)
+    else:
+        authors.update(posts_count=Greatest(F('posts_count') + delta, 0))
+        authors.filter(posts_count=0).delete()
+    fields = {
+        'posts_count': Greatest(F('posts_count') + delta, 0),
+        'authors_count': count_related(
+            GroupAuthor.objects, 'group', 'group_id'),
+    }
+    if moment is not None:
+        fields['last_activity'] = latest('last_activity', moment)
+    change_group_stats(group_id, **fields)
+
+
+def touch_group(post_id, moment):
+    """Отмечает активность в группе поста, возвращает True для постов
+    в группе."""
+    return bool(GroupStats.objects.filter(
+        group__posts_of_group=post_id
+    ).update(last_activity=latest('last_activity', moment)))
+
+
+def count_related(queryset, field, outer_field='pk'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer_field)})
+            .order_by()
+            .values(field)
+            .annotate(amount=Count('pk'))
+            .values('amount')
+        ),
+        0
+    )
+
+
+def recount_follows(user_ids, author_ids):
+    """Пересчитывает счетчики подписок затронутых профилей."""
+    Profile.objects.filter(user_id__in=author_ids).update(
+        followers_count=count_related(Follow.objects, 'author', 'user_id')
+    )
+    Profile.objects.filter(user_id__in=user_ids).update(
+        following_count=count_related(Follow.objects, 'user', 'user_id')
+    )
+
+
+@transaction.atomic
+def rebuild_counters():
+    """Пересчитывает все счетчики одним UPDATE на таблицу."""
+    Profile.objects.bulk_create(
+        (
+            Profile(user_id=user_id)
+            for user_id in User.objects.filter(
+                profile__isnull=True
+            ).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    Profile.objects.update(
+        posts_count=count_related(Post.objects, 'author', 'user_id'),
+        followers_count=count_related(Follow.objects, 'author', 'user_id'),
+        following_count=count_related(Follow.objects, 'user', 'user_id'),
+    )
+    Post.objects.update(
+        comments_count=count_related(Comment.objects, 'post'),
+    )
+    rebuild_group_stats()
+
+
+def latest_related(queryset, field, group_field, outer_field='group_id'):
+    return Subquery(
+        queryset.filter(**{group_field: OuterRef(outer_field)})
+        .order_by()
+        .values(group_field)
+        .annotate(last=Max(field))
+        .values('last')
+    )
+
+
+def rebuild_group_stats():
+    """Сверяет статистику групп с постами и комментариями."""
+    GroupStats.objects.bulk_create(
+        (
+            GroupStats(group_id=group_id)
+            for group_id in Group.objects.filter(
+                stats__isnull=True
+            ).values_list('pk', flat=True)
+        ),
+        ignore_conflicts=True,
+    )
+    GroupAuthor.objects.all().delete()
+    GroupAuthor.objects.bulk_create(
+        GroupAuthor(group_id=group_id, author_id=author_id, posts_count=amount)
+        for group_id, author_id, amount in Post.objects.filter(
+            group__isnull=False
+        ).order_by().values_list('group_id', 'author_id').annotate(
+            amount=Count('pk')
+        ).iterator()
+    )
+    last_post = latest_related(Post.objects, 'pub_date', 'group')
+    last_comment = latest_related(
+        Comment.objects, 'created', 'post__group')
+    GroupStats.objects.update(
+        posts_count=count_related(Post.objects, 'group', 'group_id'),
+        authors_count=count_related(
+            GroupAuthor.objects, 'group', 'group_id'),
+        last_activity=Greatest(
+            Coalesce(last_post, last_comment),
+            Coalesce(last_comment, last_post),
+        ),
+    )
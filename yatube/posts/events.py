@@ -0,0 +1,137 @@
+"""Уведомления о новых постах для открытых страниц лент (SSE).
+
+Пост публикуется в каналы ``index``, ``author:<id>`` и ``group:<slug>``
+после коммита транзакции. Страница ленты подписывается на свои каналы
+через /events/ и показывает, сколько появилось новых постов.
+
+LocalBroker держит подписки в памяти процесса, поэтому события видят
+только клиенты того же процесса. Брокер выбирается настройкой
+EVENTS_BROKER, внешний брокер добавляется в BROKERS с теми же методами
+subscribe и publish.
+
+Поток занимает воркер WSGI на EVENTS_STREAM_TIMEOUT секунд, поэтому
+уведомления выключены, пока EVENTS_ENABLED не включат для отдельного
+асинхронного сервера событий.
+"""
+import json
+import queue
+import threading
+from time import monotonic
+
+from django.conf import settings
+
+_broker = None
+
+
+class Subscription:
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=settings.EVENTS_QUEUE_SIZE)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def put(self, message):
+        """Медленный клиент теряет события, а не копит их в памяти."""
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """Публикация и подписка внутри одного процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.channels = {}
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, tuple(channels))
+        with self.lock:
+            for channel in subscription.channels:
+                self.channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is None:
+                    continue
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.channels[channel]
+
+    def publish(self, channels, message):
+        """Отправляет сообщение один раз каждому подписчику каналов."""
+        with self.lock:
+            subscriptions = set().union(
+                *(self.channels.get(channel, ()) for channel in channels))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+
+BROKERS = {
+    'local': LocalBroker,
+}
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        _broker = BROKERS[settings.EVENTS_BROKER]()
+    return _broker
+
+
+def post_channels(post, group_slug=None):
+    channels = ['index', f'author:{post.author_id}']
+    if group_slug is not None:
+        channels.append(f'group:{group_slug}')
+    return channels
+
+
+def publish_post(post, group_slug=None):
+    get_broker().publish(
+        post_channels(post, group_slug),
+        {'id': post.pk, 'author': post.author_id, 'group': group_slug},
+    )
+
+
+def format_event(message):
+    return (
+        f'id: {message["id"]}\n'
+        'event: post\n'
+        f'data: {json.dumps(message)}\n\n'
+    )
+
+
+def event_stream(channels, backlog=()):
+    """Поток SSE: пропущенные посты, затем новые и пустые пинги.
+
+    Подписка создается при первой итерации, поэтому ответ, который так
+    и не начали читать, не оставляет подписку в брокере. Соединение
+    закрывается через EVENTS_STREAM_TIMEOUT, браузер переподключается
+    сам и присылает Last-Event-ID.
+    """
+    subscription = get_broker().subscribe(channels)
+    try:
+        yield f'retry: {settings.EVENTS_RETRY_MS}\n\n'
+        for message in backlog:
+            yield format_event(message)
+        deadline = monotonic() + settings.EVENTS_STREAM_TIMEOUT
+        while monotonic() < deadline:
+            message = subscription.get(settings.EVENTS_KEEPALIVE)
+            if message is None:
+                yield ': keepalive\n\n'
+            else:
+                yield format_event(message)
+    finally:
+        subscription.close()
@@ -0,0 +1,164 @@
+from collections import defaultdict
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.tasks import enqueue
+
+from .models import FeedEntry, Follow, Post, Profile
+
+
+def heavy(prefix=''):
+    """Условие на профиль автора, чьи посты читаются из Post напрямую.
+
+    Это авторы с большим числом подписчиков и авторы с feed_pull: их
+    посты не раскладывались по лентам, пока автор был «тяжелым», и
+    флаг держит их в чтении из Post, даже когда подписчиков стало
+    меньше. Флаг снимает только rebuild_feeds.
+    """
+    return (
+        Q(**{f'{prefix}feed_pull': True})
+        | Q(**{f'{prefix}followers_count__gt':
+               settings.FOLLOW_FEED_FANOUT_LIMIT})
+    )
+
+
+def mark_pull(author_ids):
+    """Отмечает авторов, посты которых пропущены в лентах."""
+    Profile.objects.filter(
+        user_id__in=author_ids, feed_pull=False,
+        followers_count__gt=settings.FOLLOW_FEED_FANOUT_LIMIT,
+    ).update(feed_pull=True)
+
+
+def is_heavy_author(author):
+    """Авторы с большим числом подписчиков читаются из Post напрямую."""
+    return Profile.objects.filter(heavy(), user=author).exists()
+
+
+def heavy_authors(user):
+    return list(
+        Follow.objects.filter(
+            heavy('author__profile__'), user=user,
+        ).values_list('author_id', flat=True)
+    )
+
+
+def bulk_insert_entries(entries):
+    batch_size = settings.FOLLOW_FEED_BATCH_SIZE
+    while True:
+        batch = list(islice(entries, batch_size))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Кладет новый пост в ленты всех подписчиков автора.
+
+    Если подписчиков больше FOLLOW_FEED_INLINE_FANOUT, рассылка
+    выполняется задачей очереди, а не в запросе автора.
+    """
+    followers_count, feed_pull = Profile.objects.filter(
+        user_id=post.author_id
+    ).values_list('followers_count', 'feed_pull').first() or (0, False)
+    if feed_pull:
+        return
+    if followers_count > settings.FOLLOW_FEED_FANOUT_LIMIT:
+        mark_pull([post.author_id])
+        return
+    if followers_count > settings.FOLLOW_FEED_INLINE_FANOUT:
+        enqueue('posts.fan_out', post.pk, key=f'fan_out:{post.pk}')
+        return
+    insert_post_entries(post.pk, post.author_id)
+
+
+def insert_post_entries(post_id, author_id):
+    """Вставляет пост в ленты подписчиков, возвращает их id."""
+    followers = list(Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True))
+    bulk_insert_entries(
+        FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id)
+        for user_id in followers
+    )
+    return followers
+
+
+def backfill_feed(user, author):
+    """Заполняет ленту подписчика постами нового автора."""
+    if is_heavy_author(author):
+        mark_pull([author.pk])
+        return
+    posts = author.posts_of_author.values_list('id', flat=True)
+    bulk_insert_entries(
+        FeedEntry(user=user, post_id=post_id, author=author)
+        for post_id in posts.iterator()
+    )
+
+
+def backfill_follows(pairs):
+    """Заполняет ленты постами авторов для пачки новых подписок
+    (подписчик, автор)."""
+    followers = defaultdict(list)
+    for user_id, author_id in pairs:
+        followers[author_id].append(user_id)
+    mark_pull(followers)
+    posts = Post.objects.filter(author_id__in=followers).exclude(
+        heavy('author__profile__')
+    ).values_list('id', 'author_id')
+    bulk_insert_entries(
+        FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id)
+        for post_id, author_id in posts.iterator()
+        for user_id in followers[author_id]
+    )
+
+
+def backfill_feed_authors(user, author_ids):
+    """Заполняет ленту постами сразу нескольких новых авторов."""
+    backfill_follows((user.pk, author_id) for author_id in author_ids)
+
+
+def trim_feed(user, author):
+    FeedEntry.objects.filter(user=user, author=author).delete()
+
+
+@transaction.atomic
+def rebuild_feeds():
+    """Заново раскладывает посты по лентам одним INSERT ... SELECT.
+
+    Нужен после массовой загрузки подписок и постов через bulk_create,
+    которая не вызывает сигналы. Снимает feed_pull: после пересчета в
+    лентах есть посты всех авторов, кроме тех, у кого сейчас много
+    подписчиков.
+    """
+    FeedEntry.objects.all().delete()
+    Profile.objects.filter(feed_pull=True).update(feed_pull=False)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FeedEntry._meta.db_table} '
+            '(user_id, post_id, author_id) '
+            'SELECT follow.user_id, post.id, post.author_id '
+            f'FROM {Follow._meta.db_table} follow '
+            f'JOIN {Post._meta.db_table} post '
+            'ON post.author_id = follow.author_id '
+            f'JOIN {Profile._meta.db_table} profile '
+            'ON profile.user_id = follow.author_id '
+            'WHERE profile.followers_count <= %s '
+            'ORDER BY follow.user_id, post.id',
+            [settings.FOLLOW_FEED_FANOUT_LIMIT]
+        )
+
+
+def get_follow_feed(user):
+    if not settings.FOLLOW_FEED_FANOUT:
+        return Post.objects.filter(author__following__user=user)
+    heavy = heavy_authors(user)
+    if not heavy:
+        return Post.objects.filter(feed_entries__user=user)
+    return Post.objects.filter(
+        Q(id__in=FeedEntry.objects.filter(user=user).values('post'))
+        | Q(author__in=heavy)
+    )
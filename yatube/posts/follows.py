@@ -0,0 +1,61 @@
+"""Подписка и отписка на много авторов за несколько запросов.
+
+Строки Follow вставляются пачкой в обход сигналов, поэтому счетчики,
+ленты и поколения кэша обновляются здесь же: счетчики пересчитываются
+подзапросами по всем затронутым профилям, как в rebuild_counters().
+Отписка удаляет строки обычным delete(), и их обновляют сигналы.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from .caching import bump_feeds
+from .counters import recount_follows
+from .feed import backfill_feed_authors
+from .models import FeedEntry, Follow, Recommendation
+
+User = get_user_model()
+
+
+def bump_follow_feeds(user, usernames):
+    bump_feeds(
+        f'follow:{user.pk}',
+        *(f'profile:{username}' for username in usernames)
+    )
+
+
+@transaction.atomic
+def follow_authors(user, usernames):
+    """Подписывает на авторов и возвращает логины новых подписок."""
+    authors = dict(
+        User.objects.filter(username__in=usernames)
+        .exclude(pk=user.pk)
+        .exclude(following__user=user)
+        .values_list('pk', 'username')
+    )
+    if not authors:
+        return []
+    Follow.objects.bulk_create(
+        (Follow(user=user, author_id=author_id) for author_id in authors),
+        ignore_conflicts=True,
+    )
+    recount_follows([user.pk], authors)
+    if settings.FOLLOW_FEED_FANOUT:
+        backfill_feed_authors(user, authors)
+    Recommendation.objects.filter(user=user, author_id__in=authors).delete()
+    bump_follow_feeds(user, authors.values())
+    return sorted(authors.values())
+
+
+@transaction.atomic
+def unfollow_authors(user, usernames):
+    """Отписывает от авторов и возвращает логины удаленных подписок."""
+    authors = dict(
+        User.objects.filter(username__in=usernames, following__user=user)
+        .values_list('pk', 'username')
+    )
+    if not authors:
+        return []
+    Follow.objects.filter(user=user, author_id__in=authors).delete()
+    FeedEntry.objects.filter(user=user, author_id__in=authors).delete()
+    return sorted(authors.values())
@@ -0,0 +1,162 @@
+from hashlib import md5
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max
+from django.utils import timezone
+from django.views.decorators.http import condition
+
+from .caching import get_versions
+from .feed import get_follow_feed
+from .models import Comment, Post
+
+FRESHNESS_KEY = 'freshness:{}'
+POST_AUTHOR_KEY = 'post_author:{}'
+
+
+def get_freshness(versions, newest=None):
+    """Возвращает ETag и Last-Modified для набора версий из кэша.
+
+    ``versions`` - пары (имя, pk) для get_versions, их меняют сигналы.
+    ``newest``, если передан, вызывается только при смене версий и
+    возвращает id самых новых постов и комментариев - это агрегаты по
+    индексам без чтения строк. Время первого расчета для новых версий
+    сохраняется как Last-Modified, поэтому ответ 304 не требует запросов
+    к БД.
+    """
+    generations = ':'.join(get_versions(*versions))
+    key = FRESHNESS_KEY.format(md5(generations.encode()).hexdigest())
+    state = cache.get(key)
+    if state is None:
+        state = {
+            'newest': newest() if newest else None,
+            'modified': timezone.now().replace(microsecond=0),
+        }
+        if not cache.add(key, state, settings.FEED_CACHE_TIMEOUT):
+            state = cache.get(key, state)
+    etag = md5(f'{generations}:{state["newest"]}'.encode()).hexdigest()
+    return etag, state['modified']
+
+
+def newest_post(queryset):
+    return lambda: queryset.aggregate(newest=Max('id'))['newest']
+
+
+def index_freshness(request):
+    return get_freshness(
+        (('feed', 'all'), ('feed', 'index')), newest_post(Post.objects))
+
+
+def group_freshness(request, slug):
+    return get_freshness(
+        (('feed', 'all'), ('feed', f'group:{slug}')),
+        newest_post(Post.objects.filter(group__slug=slug)),
+    )
+
+
+def profile_freshness(request, username):
+    return get_freshness(
+        (('feed', 'all'), ('feed', f'profile:{username}')),
+        newest_post(Post.objects.filter(author__username=username)),
+    )
+
+
+def follow_freshness(request):
+    user = request.user
+    return get_freshness(
+        (
+            ('feed', 'all'),
+            ('feed', 'index'),
+            ('feed', f'follow:{user.pk}'),
+        ),
+        lambda: get_follow_feed(user).aggregate(
+            newest=Max('id'))['newest'],
+    )
+
+
+def comments_freshness(request, post_id):
+    return get_freshness(
+        (('feed', 'all'), ('comments', post_id)),
+        lambda: Comment.objects.filter(post_id=post_id).aggregate(
+            newest=Max('id'))['newest'],
+    )
+
+
+def post_freshness(request, post_id):
+    return get_freshness(
+        (('feed', 'all'), ('post', post_id), ('comments', post_id)),
+        lambda: (
+            post_id,
+            Comment.objects.filter(post_id=post_id).aggregate(
+                newest=Max('id'))['newest'],
+        ),
+    )
+
+
+def post_author(post_id):
+    """id автора поста. Автор поста не меняется, кэш без срока."""
+    key = POST_AUTHOR_KEY.format(post_id)
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = Post.objects.filter(pk=post_id).values_list(
+            'author_id', flat=True).first()
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return author_id
+
+
+def user_etag(request, etag):
+    """ETag HTML-страницы, которая отличается для каждого пользователя.
+
+    В ETag входят id пользователя и CSRF-cookie, иначе после входа или
+    смены токена браузер показал бы страницу из своего кэша.
+    """
+    csrf = request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')
+    return md5(f'{etag}:{request.user.pk}:{csrf}'.encode()).hexdigest()
+
+
+def page_freshness(*feeds):
+    """Свежесть HTML-страницы ленты по тем же поколениям, что cache_feed.
+
+    Новые id не считаются: поколения и так меняются с каждым постом,
+    и первый запрос после изменения не делает лишних запросов к БД.
+    ``feeds`` подставляются аргументами view и ``user``, например
+    ``'follow:{user.pk}'``.
+    """
+    def freshness(request, *args, **kwargs):
+        etag, modified = get_freshness((
+            ('feed', 'all'),
+            *(
+                ('feed', feed.format(user=request.user, **kwargs))
+                for feed in feeds
+            ),
+        ))
+        return user_etag(request, etag), modified
+    return freshness
+
+
+def post_page_freshness(request, post_id):
+    """Страница поста еще выводит число постов автора."""
+    etag, modified = get_freshness((
+        ('feed', 'all'),
+        ('feed', f'author:{post_author(post_id)}'),
+        ('post', post_id),
+        ('comments', post_id),
+    ))
+    return user_etag(request, etag), modified
+
+
+def conditional(freshness):
+    """condition() с одним расчетом ETag и Last-Modified на запрос."""
+    def decorator(view):
+        def get_state(request, *args, **kwargs):
+            if not hasattr(request, '_freshness'):
+                request._freshness = freshness(request, *args, **kwargs)
+            return request._freshness
+
+        return condition(
+            etag_func=lambda *args, **kwargs: get_state(*args, **kwargs)[0],
+            last_modified_func=(
+                lambda *args, **kwargs: get_state(*args, **kwargs)[1]),
+        )(view)
+    return decorator
@@ -0,0 +1,99 @@
+"""Лента «Обсуждаемое»: посты по свежести и скорости комментариев.
+
+Вклад события - публикации поста или комментария - убывает вдвое за
+HOT_HALF_LIFE секунд. Вместо того чтобы со временем уменьшать все
+оценки, новое событие добавляется с весом 2 ** (t / HOT_HALF_LIFE), где
+t отсчитывается от постоянной эпохи: порядок постов при этом тот же, а
+старые оценки не меняются. Сумма весов хранится логарифмом в
+Post.hot_score, поэтому комментарий обновляет оценку одним UPDATE, а
+лента читается по индексу (-hot_score, -id) без агрегатов по Comment.
+"""
+from datetime import datetime, timezone
+from itertools import islice
+from math import exp, log
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+
+from .models import Comment, Post
+from .utils import KeysetPaginator
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def event_score(moment, weight):
+    """Логарифм веса события в момент ``moment``."""
+    elapsed = (moment - EPOCH).total_seconds()
+    return elapsed * log(2) / settings.HOT_HALF_LIFE + log(weight)
+
+
+def log_sum(scores):
+    """log(sum(e ** score)) без переполнения."""
+    top = max(scores)
+    return top + log(sum(exp(score - top) for score in scores))
+
+
+def log_add(field, score):
+    """То же для двух слагаемых выражением БД."""
+    score = Value(score)
+    return Greatest(F(field), score) + Ln(
+        1 + Exp(-Abs(F(field) - score)))
+
+
+def post_score(moment):
+    return event_score(moment, settings.HOT_POST_WEIGHT)
+
+
+def add_comment_score(comment):
+    Post.objects.filter(pk=comment.post_id).update(
+        hot_score=log_add(
+            'hot_score',
+            event_score(comment.created, settings.HOT_COMMENT_WEIGHT),
+        )
+    )
+
+
+@transaction.atomic
+def rebuild_hot_scores():
+    """Пересчитывает оценки всех постов одним проходом слиянием.
+
+    Нужен после массовой загрузки через bulk_create, которая не вызывает
+    сигналы.
+    """
+    comments = (
+        Comment.objects.order_by('post_id')
+        .values_list('post_id', 'created').iterator()
+    )
+    comment = next(comments, None)
+
+    def scores():
+        nonlocal comment
+        posts = Post.objects.order_by('id').values_list('id', 'pub_date')
+        for post_id, pub_date in posts.iterator():
+            events = [post_score(pub_date)]
+            while comment is not None and comment[0] <= post_id:
+                if comment[0] == post_id:
+                    events.append(event_score(
+                        comment[1], settings.HOT_COMMENT_WEIGHT))
+                comment = next(comments, None)
+            yield log_sum(events), post_id
+
+    rows = scores()
+    with connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, settings.SEED_BATCH_SIZE))
+            if not batch:
+                return
+            cursor.executemany(
+                f'UPDATE {Post._meta.db_table} SET hot_score = %s '
+                'WHERE id = %s',
+                batch
+            )
+
+
+class HotPaginator(KeysetPaginator):
+    """Пагинатор ленты «Обсуждаемое» по курсору (оценка, id)."""
+    key = ('hot_score', 'id')
+    key_types = (float, int)
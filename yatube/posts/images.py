@@ -0,0 +1,87 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps
+
+ALLOWED_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP', 'BMP')
+
+
+def has_alpha(image):
+    return (
+        image.mode in ('RGBA', 'LA', 'PA')
+        or 'transparency' in image.info
+    )
+
+
+def check_upload(upload):
+    """Проверяет размер файла и заголовок картинки без декодирования.
+
+    Image.open читает только заголовок, поэтому формат и размеры
+    известны до того, как Pillow распакует пиксели в память.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            code='file_too_large',
+            params={'limit': settings.POST_IMAGE_MAX_UPLOAD_SIZE // 2 ** 20},
+        )
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format not in ALLOWED_FORMATS:
+        raise ValidationError(
+            'Формат %(format)s не поддерживается.',
+            code='invalid_format',
+            params={'format': image.format},
+        )
+    width, height = image.size
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    return image
+
+
+def reencode(upload, image):
+    """Уменьшает картинку, убирает метаданные и пересохраняет ее.
+
+    thumbnail() для JPEG сначала включает draft-режим, и декодер сразу
+    отдает уменьшенное изображение, не распаковывая полный размер.
+    Картинки с прозрачностью сохраняются в PNG, остальные в JPEG.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    image.thumbnail((max_side, max_side), Image.LANCZOS, reducing_gap=3.0)
+    image = ImageOps.exif_transpose(image)
+    output = BytesIO()
+    if has_alpha(image):
+        image.convert('RGBA').save(output, 'PNG', optimize=True)
+        extension, content_type = 'png', 'image/png'
+    else:
+        image.convert('RGB').save(
+            output,
+            'JPEG',
+            quality=settings.POST_IMAGE_QUALITY,
+            optimize=True,
+            progressive=True,
+        )
+        extension, content_type = 'jpg', 'image/jpeg'
+    size = output.tell()
+    output.seek(0)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return InMemoryUploadedFile(
+        output,
+        getattr(upload, 'field_name', None),
+        f'{name}.{extension}',
+        content_type,
+        size,
+        None,
+    )
+
+
+def process_upload(upload):
+    image = check_upload(upload)
+    return reencode(upload, image)
@@ -0,0 +1,21 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from posts.recommendations import Graph, build_recommendations
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рекомендации «кого почитать» по графу подписок'
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        graph = Graph.load()
+        self.stdout.write(
+            f'Граф: {len(graph.ids)} пользователей, '
+            f'{len(graph.follows)} подписок за {perf_counter() - start:.1f} с'
+        )
+        start = perf_counter()
+        created = build_recommendations(graph)
+        self.stdout.write(self.style.SUCCESS(
+            f'Рекомендаций: {created} за {perf_counter() - start:.1f} с'))
@@ -0,0 +1,134 @@
+import csv
+import json
+from itertools import islice
+from time import perf_counter
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from posts.caching import bump_feeds
+from posts.counters import recount_follows
+from posts.feed import backfill_follows
+from posts.models import Follow
+
+User = get_user_model()
+
+
+def read_csv(file):
+    reader = csv.reader(file)
+    for row in reader:
+        if len(row) >= 2:
+            yield reader.line_num, row[0].strip(), row[1].strip()
+
+
+def read_jsonl(file):
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            edge = json.loads(line)
+            if isinstance(edge, dict):
+                user, author = edge['user'], edge['author']
+            else:
+                user, author = edge[0], edge[1]
+        except (ValueError, KeyError, IndexError, TypeError):
+            raise CommandError(
+                f'Строка {number}: ожидается {{"user": ..., "author": ...}} '
+                'или [подписчик, автор]'
+            )
+        yield number, user, author
+
+
+READERS = {
+    'csv': read_csv,
+    'jsonl': read_jsonl,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает граф подписок из CSV (подписчик,автор) или JSONL '
+        '({"user": ..., "author": ...}) потоком, пачками по '
+        'SEED_BATCH_SIZE строк'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=READERS)
+        parser.add_argument(
+            '--ids', action='store_true',
+            help='в файле id пользователей, а не логины'
+        )
+        parser.add_argument(
+            '--skip-rebuild', action='store_true',
+            help='не пересчитывать счетчики и ленты участников загрузки'
+        )
+
+    def resolve(self, edges, ids):
+        """Заменяет логины (или проверяет id) одним запросом на пачку."""
+        field = 'pk' if ids else 'username'
+        keys = []
+        for number, user, author in edges:
+            if ids:
+                try:
+                    user, author = int(user), int(author)
+                except (TypeError, ValueError):
+                    raise CommandError(
+                        f'Строка {number}: id должны быть числами')
+            keys.append((user, author))
+        users = dict(
+            User.objects.filter(
+                **{f'{field}__in': {key for edge in keys for key in edge}}
+            ).values_list(field, 'pk')
+        )
+        return [
+            (users[user], users[author]) for user, author in keys
+            if user in users and author in users
+        ]
+
+    def update_batch(self, pairs):
+        """Пересчитывает счетчики и ленты только участников пачки."""
+        recount_follows(
+            {user for user, _ in pairs}, {author for _, author in pairs})
+        if settings.FOLLOW_FEED_FANOUT:
+            backfill_follows(pairs)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        name = options['format'] or path.rpartition('.')[2]
+        if name not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {name}')
+        start = perf_counter()
+        before = Follow.objects.count()
+        read = 0
+        with open(path, newline='', encoding='utf-8') as file:
+            edges = READERS[name](file)
+            while True:
+                batch = list(islice(edges, settings.SEED_BATCH_SIZE))
+                if not batch:
+                    break
+                read += len(batch)
+                pairs = {
+                    (user, author)
+                    for user, author in self.resolve(batch, options['ids'])
+                    if user != author
+                }
+                with transaction.atomic():
+                    Follow.objects.bulk_create(
+                        (
+                            Follow(user_id=user, author_id=author)
+                            for user, author in pairs
+                        ),
+                        ignore_conflicts=True,
+                    )
+                    if not options['skip_rebuild']:
+                        self.update_batch(pairs)
+        created = Follow.objects.count() - before
+        self.stdout.write(
+            f'Прочитано {read}, добавлено {created} подписок '
+            f'за {perf_counter() - start:.1f} с'
+        )
+        bump_feeds('all')
+        self.stdout.write(self.style.SUCCESS('Подписки загружены'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.caching import bump_feeds
+from posts.counters import rebuild_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает счетчики постов, коментариев и подписок и '
+        'статистику групп. Можно запускать по расписанию для сверки'
+    )
+
+    def handle(self, *args, **options):
+        rebuild_counters()
+        # Счетчики выводятся на страницах профилей, постов и групп.
+        bump_feeds('all')
+        self.stdout.write(self.style.SUCCESS('Счетчики пересчитаны'))
@@ -0,0 +1,53 @@
+import random
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = (
+        'Быстро заполняет базу пользователями, группами, постами, '
+        'подписками и коментариями для нагрузочных тестов'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--follows', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--password', default='password')
+        parser.add_argument(
+            '--exponent', type=float, default=1.0,
+            help='показатель степенного распределения'
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--skip-search-index', action='store_true',
+            help='не перестраивать поисковый индекс'
+        )
+
+    def step(self, name, function, *args):
+        start = perf_counter()
+        created = function(*args)
+        if created is not None:
+            name = f'{name}: {created}'
+        self.stdout.write(f'{name} за {perf_counter() - start:.1f} с')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        exponent = options['exponent']
+        self.step('Пользователи', seeding.seed_users,
+                  options['users'], options['password'])
+        self.step('Группы', seeding.seed_groups, options['groups'])
+        self.step('Посты', seeding.seed_posts,
+                  options['posts'], rng, exponent)
+        self.step('Подписки', seeding.seed_follows,
+                  options['follows'], rng, exponent)
+        self.step('Коментарии', seeding.seed_comments,
+                  options['comments'], rng, exponent)
+        self.step('Счетчики, ленты и поиск', seeding.finish,
+                  not options['skip_search_index'])
+        self.stdout.write(self.style.SUCCESS('База заполнена'))
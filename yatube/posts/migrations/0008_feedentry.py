@@ -0,0 +1,87 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:56
+
+from itertools import islice
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F
+import django.db.models.deletion
+
+
+def fill_feed_entries(apps, schema_editor):
+    """Раскладывает существующие посты по лентам подписчиков.
+
+    Правило то же, что в rebuild_feeds: посты авторов, у которых больше
+    FOLLOW_FEED_FANOUT_LIMIT подписчиков, в ленты не кладутся. Счетчиков
+    в Profile еще нет, поэтому подписчики считаются по Follow.
+    """
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    Follow = apps.get_model('posts', 'Follow')
+    heavy = (
+        Follow.objects.exclude(user=F('author'))
+        .order_by()
+        .values('author')
+        .annotate(followers=Count('user', distinct=True))
+        .filter(followers__gt=settings.FOLLOW_FEED_FANOUT_LIMIT)
+        .values('author')
+    )
+    rows = (
+        Follow.objects.exclude(author__in=heavy)
+        .filter(author__posts_of_author__isnull=False)
+        .order_by('user_id', 'author__posts_of_author__id')
+        .values_list('user_id', 'author__posts_of_author__id', 'author_id')
+        .iterator()
+    )
+    while True:
+        batch = list(islice(rows, settings.FOLLOW_FEED_BATCH_SIZE))
+        if not batch:
+            return
+        FeedEntry.objects.bulk_create(
+            (
+                FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id)
+                for user_id, post_id, author_id in batch
+            ),
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'verbose_name': 'Коментарии', 'verbose_name_plural': 'Коментарии'},
+        ),
+        migrations.AlterModelOptions(
+            name='follow',
+            options={'verbose_name': 'Подписки', 'verbose_name_plural': 'Подписки'},
+        ),
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post', verbose_name='Пост')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Лента подписок',
+                'verbose_name_plural': 'Лента подписок',
+                'ordering': ('-post',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_entry_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feed_entries, migrations.RunPython.noop),
+    ]
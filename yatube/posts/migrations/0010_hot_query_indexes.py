@@ -0,0 +1,71 @@
+# Generated by Django 2.2.16 on 2026-10-18 05:59
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.expressions
+
+
+def count_related(queryset, field, outer_field='pk'):
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef(outer_field)})
+            .order_by()
+            .values(field)
+            .annotate(amount=Count('pk'))
+            .values('amount')
+        ),
+        0
+    )
+
+
+def remove_invalid_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Follow.objects.filter(user=F('author')).delete()
+    keep = (
+        Follow.objects.values('user', 'author')
+        .annotate(keep_id=Min('id'))
+        .values('keep_id')
+    )
+    Follow.objects.exclude(id__in=keep).delete()
+    # Счетчики подписок заполнены в 0009 вместе с удаленными строками.
+    Profile = apps.get_model('posts', 'Profile')
+    Profile.objects.update(
+        followers_count=count_related(Follow.objects, 'author', 'user_id'),
+        following_count=count_related(Follow.objects, 'user', 'user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_profile_counters'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='comment',
+            options={'ordering': ('created',), 'verbose_name': 'Коментарии', 'verbose_name_plural': 'Коментарии'},
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-id'], name='post_author_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-id'], name='post_group_id_idx'),
+        ),
+        migrations.RunPython(remove_invalid_follows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(_negated=True, user=django.db.models.expressions.F('author')), name='prevent_self_follow'),
+        ),
+    ]
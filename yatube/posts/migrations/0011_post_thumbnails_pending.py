@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='thumbnails_pending',
+            field=models.BooleanField(default=False, verbose_name='Миниатюры готовятся'),
+        ),
+    ]
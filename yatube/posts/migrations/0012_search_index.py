@@ -0,0 +1,230 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:09
+
+import re
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Замороженная копия posts.search.stemmer: миграция должна строить тот
+# же индекс, как бы потом ни менялся стеммер приложения.
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', 'вши', 'в'),
+    ('ывшись', 'ившись', 'ывши', 'ивши', 'ыв', 'ив'),
+)
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'нно', 'ете', 'йте', 'ешь', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+    ),
+    (
+        'уйте', 'ейте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+        'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы',
+    'ь', 'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+RV_RE = re.compile(f'^.*?[{VOWELS}](.*)$')
+R_RE = re.compile(f'^.*?[{VOWELS}][^{VOWELS}](.*)$')
+WORD_RE = re.compile(r'[^\W_]+')
+MAX_TERM_LENGTH = 64
+
+
+def _strip(rv, endings, preceded=False):
+    """Убирает самое длинное окончание из endings.
+
+    preceded - окончания первой группы, которые удаляются только после
+    «а» или «я».
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if not preceded or stem.endswith(('а', 'я')):
+                return stem
+    return None
+
+
+def _strip_grouped(rv, groups):
+    first, second = groups
+    candidates = [
+        stem for stem in (
+            _strip(rv, first, preceded=True), _strip(rv, second)
+        )
+        if stem is not None
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=len)
+
+
+def _step_1(rv):
+    stem = _strip_grouped(rv, PERFECTIVE_GERUND)
+    if stem is not None:
+        return stem
+    rv = _strip(rv, REFLEXIVE) or rv
+    stem = _strip(rv, ADJECTIVE)
+    if stem is not None:
+        return _strip_grouped(stem, PARTICIPLE) or stem
+    stem = _strip_grouped(rv, VERB)
+    if stem is not None:
+        return stem
+    stem = _strip(rv, NOUN)
+    return rv if stem is None else stem
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    match = RV_RE.match(word)
+    if match is None:
+        return word
+    rv = match.group(1)
+    prefix = word[:len(word) - len(rv)]
+    rv = _step_1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r1 = R_RE.match(prefix + rv)
+    r2 = r1 and R_RE.match(r1.group(1))
+    if r2 and _strip(r2.group(1), DERIVATIONAL) is not None:
+        rv = _strip(rv, DERIVATIONAL)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else (
+                superlative)
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Основы всех слов текста в порядке следования."""
+    return [stem(word)[:MAX_TERM_LENGTH] for word in WORD_RE.findall(text)]
+
+
+FTS_TABLE = (
+    'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+    "text, comments, tokenize = 'unicode61 remove_diacritics 0')"
+)
+
+
+def create_fts_table(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        options = {row[0] for row in cursor.fetchall()}
+    if 'ENABLE_FTS5' in options:
+        schema_editor.execute(FTS_TABLE)
+
+
+def indexed_posts(apps):
+    """Основы слов постов и их комментариев слиянием по id поста."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = (
+        Comment.objects.order_by('post_id')
+        .values_list('post_id', 'text').iterator()
+    )
+    comment = next(comments, None)
+    posts = Post.objects.order_by('id').values_list('id', 'text')
+    for post_id, text in posts.iterator():
+        terms = []
+        while comment is not None and comment[0] <= post_id:
+            if comment[0] == post_id:
+                terms += tokenize(comment[1])
+            comment = next(comments, None)
+        yield post_id, tokenize(text), terms
+
+
+def fill_search_index(apps, schema_editor):
+    """Индексирует существующие посты тем индексом, который выберет
+    posts.search.get_index()."""
+    connection = schema_editor.connection
+    has_fts = (
+        connection.vendor == 'sqlite'
+        and 'posts_search' in connection.introspection.table_names()
+    )
+    backend = settings.SEARCH_BACKEND or ('fts5' if has_fts else 'terms')
+    if backend == 'fts5':
+        with connection.cursor() as cursor:
+            for post_id, text, comments in indexed_posts(apps):
+                cursor.execute(
+                    'INSERT INTO posts_search(rowid, text, comments) '
+                    'VALUES (%s, %s, %s)',
+                    [post_id, ' '.join(text), ' '.join(comments)]
+                )
+        return
+    SearchTerm = apps.get_model('posts', 'SearchTerm')
+    rows = []
+    for post_id, text, comments in indexed_posts(apps):
+        weights = Counter(comments)
+        for term, count in Counter(text).items():
+            weights[term] += count * 2
+        rows.extend(
+            SearchTerm(term=term, post_id=post_id, weight=weight)
+            for term, weight in weights.items()
+        )
+        if len(rows) >= 5000:
+            SearchTerm.objects.bulk_create(rows)
+            rows = []
+    SearchTerm.objects.bulk_create(rows)
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_thumbnails_pending'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTerm',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64, verbose_name='Основа слова')),
+                ('weight', models.PositiveIntegerField(verbose_name='Вес')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Поисковый индекс',
+                'verbose_name_plural': 'Поисковый индекс',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='searchterm',
+            constraint=models.UniqueConstraint(fields=('term', 'post'), name='unique_search_term'),
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+        migrations.RunPython(fill_search_index, migrations.RunPython.noop),
+    ]
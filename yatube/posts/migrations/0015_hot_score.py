@@ -0,0 +1,74 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:56
+
+from datetime import datetime, timezone
+from itertools import islice
+from math import exp, log
+
+from django.conf import settings
+from django.db import migrations, models
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+BATCH_SIZE = 1000
+
+
+def score(moment, weight):
+    elapsed = (moment - EPOCH).total_seconds()
+    return elapsed * log(2) / settings.HOT_HALF_LIFE + log(weight)
+
+
+def log_sum(scores):
+    top = max(scores)
+    return top + log(sum(exp(value - top) for value in scores))
+
+
+def hot_scores(apps):
+    """Оценки постов слиянием постов и комментариев, упорядоченных по id
+    поста: в памяти только события одного поста."""
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    comments = (
+        Comment.objects.order_by('post_id')
+        .values_list('post_id', 'created').iterator()
+    )
+    comment = next(comments, None)
+    posts = Post.objects.order_by('id').values_list('id', 'pub_date')
+    for post_id, pub_date in posts.iterator():
+        events = [score(pub_date, settings.HOT_POST_WEIGHT)]
+        while comment is not None and comment[0] <= post_id:
+            if comment[0] == post_id:
+                events.append(score(comment[1], settings.HOT_COMMENT_WEIGHT))
+            comment = next(comments, None)
+        yield log_sum(events), post_id
+
+
+def fill_hot_score(apps, schema_editor):
+    table = apps.get_model('posts', 'Post')._meta.db_table
+    rows = hot_scores(apps)
+    with schema_editor.connection.cursor() as cursor:
+        while True:
+            batch = list(islice(rows, BATCH_SIZE))
+            if not batch:
+                return
+            cursor.executemany(
+                f'UPDATE {table} SET hot_score = %s WHERE id = %s', batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0014_recommendation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='hot_score',
+            field=models.FloatField(default=0, verbose_name='Рейтинг обсуждения'),
+        ),
+        migrations.RunPython(fill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-hot_score', '-id'], name='post_hot_idx'),
+        ),
+    ]
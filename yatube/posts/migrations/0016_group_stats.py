@@ -0,0 +1,90 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:57
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Max
+import django.db.models.deletion
+
+
+def fill_group_stats(apps, schema_editor):
+    Group = apps.get_model('posts', 'Group')
+    Post = apps.get_model('posts', 'Post')
+    Comment = apps.get_model('posts', 'Comment')
+    GroupStats = apps.get_model('posts', 'GroupStats')
+    GroupAuthor = apps.get_model('posts', 'GroupAuthor')
+    authors = (
+        Post.objects.filter(group__isnull=False).order_by()
+        .values_list('group_id', 'author_id').annotate(amount=Count('id'))
+    )
+    GroupAuthor.objects.bulk_create(
+        GroupAuthor(group_id=group_id, author_id=author_id, posts_count=amount)
+        for group_id, author_id, amount in authors
+    )
+    posts = dict(
+        (group_id, (amount, last))
+        for group_id, amount, last in Post.objects.filter(
+            group__isnull=False).order_by().values_list('group_id')
+        .annotate(amount=Count('id'), last=Max('pub_date'))
+    )
+    comments = dict(
+        Comment.objects.filter(post__group__isnull=False).order_by()
+        .values_list('post__group_id').annotate(last=Max('created'))
+    )
+    authors_count = dict(
+        GroupAuthor.objects.order_by().values_list('group_id')
+        .annotate(amount=Count('id'))
+    )
+    stats = []
+    for group_id in Group.objects.values_list('id', flat=True):
+        amount, last = posts.get(group_id, (0, None))
+        last = max(filter(None, (last, comments.get(group_id))), default=None)
+        stats.append(GroupStats(
+            group_id=group_id,
+            posts_count=amount,
+            authors_count=authors_count.get(group_id, 0),
+            last_activity=last,
+        ))
+    GroupStats.objects.bulk_create(stats)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0015_hot_score'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GroupStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('authors_count', models.PositiveIntegerField(default=0, verbose_name='Количество авторов')),
+                ('last_activity', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('group', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Статистика групп',
+                'verbose_name_plural': 'Статистика групп',
+            },
+        ),
+        migrations.CreateModel(
+            name='GroupAuthor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Количество постов')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('group', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='posts.Group', verbose_name='Группа')),
+            ],
+            options={
+                'verbose_name': 'Авторы групп',
+                'verbose_name_plural': 'Авторы групп',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='groupauthor',
+            constraint=models.UniqueConstraint(fields=('group', 'author'), name='unique_group_author'),
+        ),
+        migrations.RunPython(fill_group_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0017_tombstones'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='feed_pull',
+            field=models.BooleanField(default=False, verbose_name='Посты не разложены по лентам'),
+        ),
+    ]
@@ -17,6 +17,43 @@ class Group(models.Model):
         return self.title
 
 
+class ChangesQuerySet(models.QuerySet):
+    changes_field = 'updated_at'
+
+    def changed_since(self, updated_at=None, pk=None):
+        """Строки, измененные после водяной отметки (updated_at, id).
+
+        Порядок по индексу (updated_at, id) от старых изменений к новым,
+        поэтому последняя строка пачки - следующая отметка.
+        """
+        field = self.changes_field
+        queryset = self.order_by(field, 'id')
+        if updated_at is None:
+            return queryset
+        return queryset.filter(
+            models.Q(**{f'{field}__gt': updated_at})
+            | models.Q(**{field: updated_at, 'id__gt': pk or 0})
+        )
+
+
+class PostQuerySet(ChangesQuerySet):
+    def for_feed(self, *fields):
+        """Посты для лент: автор и группа одним запросом, только
+        поля, которые выводит includes/article.html, и ``fields``."""
+        return self.select_related('author', 'group').only(
+            *fields,
+            'id',
+            'text',
+            'pub_date',
+            'image',
+            'thumbnails_pending',
+            'author__username',
+            'author__first_name',
+            'author__last_name',
+            'group__slug',
+        )
+
+
 class Post(models.Model):
     text = models.TextField(verbose_name='Содержание поста')
     pub_date = models.DateTimeField(
@@ -42,11 +79,47 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails_pending = models.BooleanField(
+        default=False,
+        verbose_name='Миниатюры готовятся'
+    )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество коментариев'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+    hot_score = models.FloatField(
+        default=0,
+        verbose_name='Рейтинг обсуждения'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Посты'
         verbose_name_plural = 'Посты'
         ordering = ('-id',)
+        indexes = (
+            models.Index(
+                fields=('author', '-id'),
+                name='post_author_id_idx'
+            ),
+            models.Index(
+                fields=('group', '-id'),
+                name='post_group_id_idx'
+            ),
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='post_updated_idx'
+            ),
+            models.Index(
+                fields=('-hot_score', '-id'),
+                name='post_hot_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -70,10 +143,27 @@ class Comment(models.Model):
         verbose_name='Дата коментария'
     )
     text = models.TextField(verbose_name='Коментарий')
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения'
+    )
+
+    objects = ChangesQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Коментарии'
         verbose_name_plural = 'Коментарии'
+        ordering = ('created',)
+        indexes = (
+            models.Index(
+                fields=('post', 'created'),
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=('updated_at', 'id'),
+                name='comment_updated_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -96,6 +186,250 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписки'
         verbose_name_plural = 'Подписки'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+            models.CheckConstraint(
+                check=~models.Q(user=models.F('author')),
+                name='prevent_self_follow'
+            ),
+        )
 
     def __str__(self):
         return self.author.username
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    class Meta:
+        verbose_name = 'Лента подписок'
+        verbose_name_plural = 'Лента подписок'
+        ordering = ('-post',)
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_feed_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', 'author'),
+                name='feed_entry_user_author_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} <- {self.post}'
+
+
+class Profile(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество подписок'
+    )
+    feed_pull = models.BooleanField(
+        default=False,
+        verbose_name='Посты не разложены по лентам'
+    )
+
+    class Meta:
+        verbose_name = 'Профили'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self):
+        return self.user.username
+
+
+class SearchTerm(models.Model):
+    term = models.CharField(max_length=64, verbose_name='Основа слова')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='search_terms',
+        verbose_name='Пост'
+    )
+    weight = models.PositiveIntegerField(verbose_name='Вес')
+
+    class Meta:
+        verbose_name = 'Поисковый индекс'
+        verbose_name_plural = 'Поисковый индекс'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('term', 'post'),
+                name='unique_search_term'
+            ),
+        )
+
+    def __str__(self):
+        return self.term
+
+
+class Recommendation(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='recommendations',
+        verbose_name='Пользователь'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        verbose_name = 'Рекомендации'
+        verbose_name_plural = 'Рекомендации'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_recommendation'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-score'),
+                name='recommendation_user_score_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.user} -> {self.author}'
+
+
+class GroupStats(models.Model):
+    group = models.OneToOneField(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='stats',
+        verbose_name='Группа'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+    authors_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество авторов'
+    )
+    last_activity = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последняя активность'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика групп'
+        verbose_name_plural = 'Статистика групп'
+
+    def __str__(self):
+        return str(self.group)
+
+
+class GroupAuthor(models.Model):
+    """Число постов автора в группе, из него считается authors_count."""
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Группа'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Количество постов'
+    )
+
+    class Meta:
+        verbose_name = 'Авторы групп'
+        verbose_name_plural = 'Авторы групп'
+        constraints = (
+            models.UniqueConstraint(
+                fields=('group', 'author'),
+                name='unique_group_author'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.author} в {self.group}'
+
+
+class TombstoneQuerySet(ChangesQuerySet):
+    changes_field = 'deleted_at'
+
+
+class Tombstone(models.Model):
+    """Удаленный пост или комментарий для синхронизации через API."""
+    POST = 'post'
+    COMMENT = 'comment'
+    KINDS = (
+        (POST, 'Пост'),
+        (COMMENT, 'Коментарий'),
+    )
+
+    kind = models.CharField(
+        max_length=10,
+        choices=KINDS,
+        verbose_name='Тип'
+    )
+    object_id = models.PositiveIntegerField(verbose_name='id объекта')
+    deleted_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата удаления'
+    )
+
+    objects = TombstoneQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Удаленные объекты'
+        verbose_name_plural = 'Удаленные объекты'
+        indexes = (
+            models.Index(
+                fields=('kind', 'deleted_at', 'id'),
+                name='tombstone_changes_idx'
+            ),
+        )
+
+    def __str__(self):
+        return f'{self.kind} {self.object_id}'
@@ -0,0 +1,226 @@
+"""Рекомендации «кого почитать» по графу подписок.
+
+build_recommendations() загружает граф Follow в массивы array (формат
+CSR: смещения и соседи подряд) вместо объектов ORM и считает для
+каждого пользователя две оценки:
+
+* друзья друзей - авторы, на которых подписаны мои авторы;
+* совместные подписки - авторы, которых читают похожие пользователи,
+  то есть те, кто подписан на тех же авторов, что и я.
+
+Лучшие RECOMMENDATIONS_COUNT авторов сохраняются в Recommendation и
+читаются страницами одним запросом. Новые подписки поправляют оценки
+сразу (update_on_follow), полный пересчет - команда
+build_recommendations.
+"""
+import heapq
+from array import array
+from collections import defaultdict
+from itertools import islice
+from math import log2
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import F
+
+from .caching import bump_feeds
+from .models import Follow, Recommendation
+
+User = get_user_model()
+
+FRIENDS_WEIGHT = 1.0
+
+
+class Graph:
+    """Граф подписок в двух представлениях CSR: подписки и подписчики."""
+
+    def __init__(self, user_ids, edges):
+        self.ids = array('q', user_ids)
+        self.index = {user_id: number for number, user_id in
+                      enumerate(self.ids)}
+        size = len(self.ids)
+        users = array('l')
+        authors = array('l')
+        for user_id, author_id in edges:
+            users.append(self.index[user_id])
+            authors.append(self.index[author_id])
+        self.follows_offsets, self.follows = self.compress(
+            users, authors, size)
+        self.followers_offsets, self.followers = self.compress(
+            authors, users, size)
+
+    @staticmethod
+    def compress(sources, targets, size):
+        """Раскладывает ребра по источникам сортировкой подсчетом."""
+        offsets = array('l', [0]) * (size + 1)
+        for source in sources:
+            offsets[source + 1] += 1
+        for number in range(size):
+            offsets[number + 1] += offsets[number]
+        position = offsets[:-1]
+        neighbours = array('l', [0]) * len(targets)
+        for source, target in zip(sources, targets):
+            neighbours[position[source]] = target
+            position[source] += 1
+        return offsets, neighbours
+
+    def following(self, node):
+        return self.follows[
+            self.follows_offsets[node]:self.follows_offsets[node + 1]]
+
+    def followers_of(self, node):
+        return self.followers[
+            self.followers_offsets[node]:self.followers_offsets[node + 1]]
+
+    @classmethod
+    def load(cls):
+        edges = Follow.objects.order_by().values_list(
+            'user_id', 'author_id').iterator(
+                chunk_size=settings.RECOMMENDATIONS_BATCH_SIZE)
+        return cls(
+            User.objects.order_by('pk').values_list('pk', flat=True),
+            edges,
+        )
+
+
+def score_user(graph, node, popular):
+    """Лучшие авторы для пользователя ``node`` с оценками."""
+    followed = set(graph.following(node))
+    sample = settings.RECOMMENDATIONS_SAMPLE
+    scores = defaultdict(float)
+    similar = defaultdict(int)
+    for author in followed:
+        for candidate in islice(graph.following(author), sample):
+            scores[candidate] += FRIENDS_WEIGHT
+        for reader in islice(graph.followers_of(author), sample):
+            similar[reader] += 1
+    similar.pop(node, None)
+    neighbours = heapq.nlargest(
+        settings.RECOMMENDATIONS_NEIGHBOURS,
+        similar.items(),
+        key=lambda item: item[1],
+    )
+    for reader, common in neighbours:
+        weight = common / log2(2 + len(graph.following(reader)))
+        for candidate in islice(graph.following(reader), sample):
+            scores[candidate] += weight
+    for candidate in followed:
+        scores.pop(candidate, None)
+    scores.pop(node, None)
+    best = heapq.nlargest(
+        settings.RECOMMENDATIONS_COUNT,
+        scores.items(),
+        key=lambda item: item[1],
+    )
+    # Новичкам без подписок и с короткими списками - популярные авторы.
+    for candidate, score in popular:
+        if len(best) >= settings.RECOMMENDATIONS_COUNT:
+            break
+        if candidate != node and candidate not in followed and all(
+            candidate != chosen for chosen, _ in best
+        ):
+            best.append((candidate, score))
+    return best
+
+
+def popular_authors(graph):
+    """Авторы с наибольшим числом подписчиков, с малой оценкой."""
+    offsets = graph.followers_offsets
+    top = heapq.nlargest(
+        settings.RECOMMENDATIONS_COUNT * 2,
+        range(len(graph.ids)),
+        key=lambda node: offsets[node + 1] - offsets[node],
+    )
+    return [
+        (node, 1 / (2 + rank)) for rank, node in enumerate(top)
+        if offsets[node + 1] > offsets[node]
+    ]
+
+
+def build_recommendations(graph=None):
+    """Пересчитывает рекомендации всех пользователей пачками.
+
+    Рекомендации выводятся на страницах с поколением ``follow:{pk}``
+    читателя, поэтому после каждой пачки оно сбрасывается.
+    """
+    graph = graph or Graph.load()
+    popular = popular_authors(graph)
+    ids = graph.ids
+    batch_size = settings.RECOMMENDATIONS_BATCH_SIZE
+    created = 0
+    for start in range(0, len(ids), batch_size):
+        nodes = range(start, min(start + batch_size, len(ids)))
+        rows = [
+            Recommendation(
+                user_id=ids[node],
+                author_id=ids[candidate],
+                score=score,
+            )
+            for node in nodes
+            for candidate, score in score_user(graph, node, popular)
+        ]
+        with transaction.atomic():
+            Recommendation.objects.filter(
+                user_id__gte=ids[nodes[0]],
+                user_id__lte=ids[nodes[-1]],
+            ).delete()
+            Recommendation.objects.bulk_create(rows)
+        bump_feeds(*(f'follow:{ids[node]}' for node in nodes))
+        created += len(rows)
+    return created
+
+
+def update_on_follow(user_id, author_id):
+    """Поправляет рекомендации подписчика после новой подписки.
+
+    Автор больше не рекомендуется, а его собственные подписки получают
+    оценку «друга друга». Остаются лучшие RECOMMENDATIONS_COUNT
+    авторов, полный пересчет уточнит остальное.
+    """
+    Recommendation.objects.filter(
+        user_id=user_id, author_id=author_id).delete()
+    candidates = set(
+        Follow.objects.filter(user_id=author_id)
+        .exclude(author_id=user_id)
+        .exclude(author__following__user_id=user_id)
+        .values_list('author_id', flat=True)
+        [:settings.RECOMMENDATIONS_SAMPLE]
+    )
+    if not candidates:
+        return
+    existing = set(
+        Recommendation.objects.filter(
+            user_id=user_id, author_id__in=candidates
+        ).values_list('author_id', flat=True)
+    )
+    Recommendation.objects.filter(
+        user_id=user_id, author_id__in=existing
+    ).update(score=F('score') + FRIENDS_WEIGHT)
+    Recommendation.objects.bulk_create(
+        (
+            Recommendation(
+                user_id=user_id, author_id=candidate, score=FRIENDS_WEIGHT)
+            for candidate in candidates - existing
+        ),
+        ignore_conflicts=True,
+    )
+    recommendations = Recommendation.objects.filter(user_id=user_id)
+    best = list(
+        recommendations.order_by('-score', 'pk')
+        .values_list('pk', flat=True)[:settings.RECOMMENDATIONS_COUNT]
+    )
+    recommendations.exclude(pk__in=best).delete()
+
+
+def get_recommendations(user):
+    """Рекомендованные авторы одним запросом по индексу (user, -score)."""
+    if not user.is_authenticated:
+        return []
+    return [
+        recommendation.author
+        for recommendation in user.recommendations.select_related('author')
+        .only('author', 'author__username', 'author__first_name',
+              'author__last_name')
+        .order_by('-score')[:settings.RECOMMENDATIONS_COUNT]
+    ]
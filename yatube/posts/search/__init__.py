@@ -0,0 +1,82 @@
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from ..models import Comment, Post
+from ..utils import KeysetPaginator
+from .backends import FTS5Index, TermsIndex
+from .stemmer import tokenize
+
+BACKENDS = {
+    'fts5': FTS5Index,
+    'terms': TermsIndex,
+}
+
+
+@lru_cache(maxsize=None)
+def has_fts_table():
+    if connection.vendor != 'sqlite':
+        return False
+    return 'posts_search' in connection.introspection.table_names()
+
+
+def get_index():
+    """Индекс из SEARCH_BACKEND, по умолчанию FTS5 там, где он есть."""
+    name = settings.SEARCH_BACKEND
+    if name is None:
+        name = 'fts5' if has_fts_table() else 'terms'
+    return BACKENDS[name]()
+
+
+@transaction.atomic
+def rebuild_index():
+    """Строит индекс заново за один проход по постам и комментариям.
+
+    Оба запроса упорядочены по id поста, поэтому комментарии
+    склеиваются с постами слиянием, без запроса на каждый пост.
+    """
+    index = get_index()
+    index.clear()
+    comments = (
+        Comment.objects.order_by('post_id')
+        .values_list('post_id', 'text').iterator()
+    )
+    comment = next(comments, None)
+    posts = Post.objects.order_by('id').values_list('id', 'text')
+    for post_id, text in posts.iterator():
+        terms = []
+        while comment is not None and comment[0] <= post_id:
+            if comment[0] == post_id:
+                terms += tokenize(comment[1])
+            comment = next(comments, None)
+        index.write(post_id, tokenize(text), terms)
+
+
+class SearchPaginator(KeysetPaginator):
+    """Пагинатор результатов поиска по курсору (релевантность, id).
+
+    Посты упорядочены по убыванию релевантности, поэтому курсором служит
+    пара из релевантности и id последнего поста, а не один id.
+    """
+    key = ('score', 'id')
+    key_types = (float, int)
+
+    def __init__(self, query, per_page):
+        super().__init__(Post.objects.for_feed(), per_page)
+        self.terms = list(dict.fromkeys(tokenize(query)))
+        self.params = urlencode({'q': query}) + '&'
+
+    def keyset(self, cursor, reverse=False):
+        if not self.terms:
+            return []
+        hits = get_index().search(
+            self.terms, cursor, reverse, self.per_page + 1)
+        posts = self.object_list.in_bulk([post_id for _, post_id in hits])
+        rows = []
+        for score, post_id in hits:
+            if post_id in posts:
+                posts[post_id].score = score
+                rows.append(posts[post_id])
+        return rows
@@ -0,0 +1,193 @@
+import math
+from collections import Counter
+
+from django.db import connection
+from django.db.models import (Case, Count, F, FloatField, Max, Q, Sum, Value,
+                              When)
+from django.db.models.functions import Greatest
+
+from ..models import Comment, Post, SearchTerm
+from .stemmer import tokenize
+
+
+def post_terms(post):
+    """Основы слов поста и всех его комментариев."""
+    comments = Comment.objects.filter(post_id=post.pk).values_list(
+        'text', flat=True)
+    return tokenize(post.text), [
+        term for text in comments.iterator() for term in tokenize(text)
+    ]
+
+
+class FTS5Index:
+    """Индекс во встроенной таблице SQLite FTS5 ``posts_search``.
+
+    В таблицу пишутся уже выделенные основы слов, rowid совпадает с id
+    поста. Релевантность считает bm25(), текст поста весит вдвое больше
+    комментариев.
+    """
+    SCORE = '-bm25(posts_search, 2.0, 1.0)'
+
+    def index_post(self, post):
+        self.write(post.pk, *post_terms(post))
+
+    def write(self, post_id, text, comments):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM posts_search WHERE rowid = %s', [post_id])
+            cursor.execute(
+                'INSERT INTO posts_search(rowid, text, comments) '
+                'VALUES (%s, %s, %s)',
+                [post_id, ' '.join(text), ' '.join(comments)]
+            )
+
+    def add_comment(self, comment):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "UPDATE posts_search SET comments = comments || ' ' || %s "
+                'WHERE rowid = %s',
+                [' '.join(tokenize(comment.text)), comment.post_id]
+            )
+            indexed = cursor.rowcount
+        if not indexed:
+            self.index_post(comment.post)
+
+    def remove_comment(self, comment):
+        terms = tokenize(comment.text)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT comments FROM posts_search WHERE rowid = %s',
+                [comment.post_id]
+            )
+            row = cursor.fetchone()
+            if row is None or not terms:
+                return
+            comments = row[0].split()
+            for start in range(len(comments) - len(terms) + 1):
+                if comments[start:start + len(terms)] == terms:
+                    del comments[start:start + len(terms)]
+                    break
+            cursor.execute(
+                'UPDATE posts_search SET comments = %s WHERE rowid = %s',
+                [' '.join(comments), comment.post_id]
+            )
+
+    def remove_post(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'DELETE FROM posts_search WHERE rowid = %s', [post_id])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM posts_search')
+
+    def search(self, terms, cursor=None, reverse=False, limit=10):
+        """Возвращает пары (релевантность, id поста) за курсором."""
+        query = ' '.join(f'"{term}"' for term in terms)
+        params = [query]
+        where = ''
+        if cursor is not None:
+            op = '>' if reverse else '<'
+            where = f'WHERE score {op} %s OR (score = %s AND id {op} %s)'
+            params += [cursor[0], cursor[0], cursor[1]]
+        order = 'ASC' if reverse else 'DESC'
+        with connection.cursor() as db_cursor:
+            db_cursor.execute(
+                f'SELECT score, id FROM ('
+                f'SELECT {self.SCORE} AS score, rowid AS id '
+                f'FROM posts_search WHERE posts_search MATCH %s) '
+                f'{where} ORDER BY score {order}, id {order} LIMIT %s',
+                params + [limit]
+            )
+            return db_cursor.fetchall()
+
+
+class TermsIndex:
+    """Переносимый индекс в таблице SearchTerm: основа слова, пост и вес.
+
+    Вес - число вхождений основы, слова из текста поста считаются
+    дважды. Как и в FTS5, пост должен содержать все основы запроса,
+    релевантность - сумма их tf-idf.
+    """
+    TEXT_WEIGHT = 2
+
+    def index_post(self, post):
+        self.write(post.pk, *post_terms(post))
+
+    def write(self, post_id, text, comments):
+        weights = Counter(comments)
+        for term, count in Counter(text).items():
+            weights[term] += count * self.TEXT_WEIGHT
+        SearchTerm.objects.filter(post_id=post_id).delete()
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=post_id, weight=weight)
+            for term, weight in weights.items()
+        )
+
+    def add_comment(self, comment):
+        weights = Counter(tokenize(comment.text))
+        rows = SearchTerm.objects.filter(post_id=comment.post_id)
+        existing = set(
+            rows.filter(term__in=weights).values_list('term', flat=True))
+        for term in existing:
+            rows.filter(term=term).update(weight=F('weight') + weights[term])
+        SearchTerm.objects.bulk_create(
+            SearchTerm(term=term, post_id=comment.post_id, weight=weight)
+            for term, weight in weights.items() if term not in existing
+        )
+
+    def remove_comment(self, comment):
+        rows = SearchTerm.objects.filter(post_id=comment.post_id)
+        for term, count in Counter(tokenize(comment.text)).items():
+            rows.filter(term=term).update(
+                weight=Greatest(F('weight') - count, 0))
+        rows.filter(weight=0).delete()
+
+    def remove_post(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def idf(self, terms):
+        # Число постов оценивается по максимальному id: это чтение
+        # индекса вместо COUNT по всей таблице.
+        total = Post.objects.aggregate(total=Max('id'))['total'] or 0
+        found = Counter(dict(
+            SearchTerm.objects.filter(term__in=terms)
+            .values('term')
+            .annotate(posts=Count('post'))
+            .values_list('term', 'posts')
+        ))
+        return {
+            term: math.log(1 + total / found[term])
+            for term in terms if found[term]
+        }
+
+    def search(self, terms, cursor=None, reverse=False, limit=10):
+        idf = self.idf(terms)
+        if len(idf) < len(terms):
+            return []
+        score = Sum(
+            F('weight') * Case(
+                *(When(term=term, then=Value(value))
+                  for term, value in idf.items()),
+                output_field=FloatField(),
+            ),
+            output_field=FloatField(),
+        )
+        rows = (
+            SearchTerm.objects.filter(term__in=idf)
+            .values('post_id')
+            .annotate(matched=Count('term'), score=score)
+            .filter(matched=len(idf))
+        )
+        if cursor is not None:
+            lookup = 'gt' if reverse else 'lt'
+            rows = rows.filter(
+                Q(**{f'score__{lookup}': cursor[0]})
+                | Q(score=cursor[0], **{f'post_id__{lookup}': cursor[1]})
+            )
+        order = ('score', 'post_id') if reverse else ('-score', '-post_id')
+        return list(
+            rows.order_by(*order).values_list('score', 'post_id')[:limit])
@@ -0,0 +1,118 @@
+"""Стеммер Портера (Snowball) для русского языка."""
+import re
+from functools import lru_cache
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('вшись', 'вши', 'в'),
+    ('ывшись', 'ившись', 'ывши', 'ивши', 'ыв', 'ив'),
+)
+REFLEXIVE = ('ся', 'сь')
+ADJECTIVE = (
+    'ими', 'ыми', 'его', 'ого', 'ему', 'ому', 'ее', 'ие', 'ые', 'ое',
+    'ей', 'ий', 'ый', 'ой', 'ем', 'им', 'ым', 'ом', 'их', 'ых', 'ую',
+    'юю', 'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+VERB = (
+    (
+        'нно', 'ете', 'йте', 'ешь', 'ла', 'на', 'ли', 'ем', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'й', 'л', 'н',
+    ),
+    (
+        'уйте', 'ейте', 'ила', 'ыла', 'ена', 'ите', 'или', 'ыли', 'ило',
+        'ыло', 'ено', 'ует', 'уют', 'ены', 'ить', 'ыть', 'ишь', 'ей', 'уй',
+        'ил', 'ыл', 'им', 'ым', 'ен', 'ят', 'ит', 'ыт', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'иями', 'ями', 'ами', 'ией', 'иям', 'ием', 'иях', 'ев', 'ов', 'ие',
+    'ье', 'еи', 'ии', 'ей', 'ой', 'ий', 'ям', 'ем', 'ам', 'ом', 'ах',
+    'ях', 'ию', 'ью', 'ия', 'ья', 'а', 'е', 'и', 'й', 'о', 'у', 'ы',
+    'ь', 'ю', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+RV_RE = re.compile(f'^.*?[{VOWELS}](.*)$')
+R_RE = re.compile(f'^.*?[{VOWELS}][^{VOWELS}](.*)$')
+WORD_RE = re.compile(r'[^\W_]+')
+MAX_TERM_LENGTH = 64
+
+
+def _strip(rv, endings, preceded=False):
+    """Убирает самое длинное окончание из endings.
+
+    preceded - окончания первой группы, которые удаляются только после
+    «а» или «я».
+    """
+    for ending in sorted(endings, key=len, reverse=True):
+        if rv.endswith(ending):
+            stem = rv[:-len(ending)]
+            if not preceded or stem.endswith(('а', 'я')):
+                return stem
+    return None
+
+
+def _strip_grouped(rv, groups):
+    first, second = groups
+    candidates = [
+        stem for stem in (
+            _strip(rv, first, preceded=True), _strip(rv, second)
+        )
+        if stem is not None
+    ]
+    if not candidates:
+        return None
+    return min(candidates, key=len)
+
+
+def _step_1(rv):
+    stem = _strip_grouped(rv, PERFECTIVE_GERUND)
+    if stem is not None:
+        return stem
+    rv = _strip(rv, REFLEXIVE) or rv
+    stem = _strip(rv, ADJECTIVE)
+    if stem is not None:
+        return _strip_grouped(stem, PARTICIPLE) or stem
+    stem = _strip_grouped(rv, VERB)
+    if stem is not None:
+        return stem
+    stem = _strip(rv, NOUN)
+    return rv if stem is None else stem
+
+
+@lru_cache(maxsize=100000)
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    match = RV_RE.match(word)
+    if match is None:
+        return word
+    rv = match.group(1)
+    prefix = word[:len(word) - len(rv)]
+    rv = _step_1(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+    r1 = R_RE.match(prefix + rv)
+    r2 = r1 and R_RE.match(r1.group(1))
+    if r2 and _strip(r2.group(1), DERIVATIONAL) is not None:
+        rv = _strip(rv, DERIVATIONAL)
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative[:-1] if superlative.endswith('нн') else (
+                superlative)
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Основы всех слов текста в порядке следования."""
+    return [stem(word)[:MAX_TERM_LENGTH] for word in WORD_RE.findall(text)]
@@ -0,0 +1,180 @@
+"""Быстрая массовая загрузка данных для фикстур и бенчмарков.
+
+Строки пишутся через bulk_create пачками, каждая пачка в своей
+транзакции, у всех пользователей один заранее посчитанный хэш пароля.
+Подписки, посты и комментарии распределены по степенному закону:
+несколько авторов собирают большую часть подписчиков, несколько постов -
+большую часть комментариев. bulk_create обходит сигналы, поэтому после
+загрузки нужно вызвать finish().
+"""
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .counters import rebuild_counters
+from .feed import rebuild_feeds
+from .hot import rebuild_hot_scores
+from .models import Comment, Follow, Group, Post
+from .search import rebuild_index
+
+User = get_user_model()
+
+WORDS = (
+    'котик', 'молоко', 'город', 'весна', 'дорога', 'книга', 'музыка',
+    'море', 'поезд', 'дождь', 'солнце', 'лес', 'друзья', 'работа', 'кофе',
+)
+
+
+def bulk_insert(model, objects):
+    """Вставляет объекты пачками по SEED_BATCH_SIZE, пачка - транзакция."""
+    created = 0
+    while True:
+        batch = list(islice(objects, settings.SEED_BATCH_SIZE))
+        if not batch:
+            return created
+        with transaction.atomic():
+            model.objects.bulk_create(batch)
+        created += len(batch)
+
+
+def random_text(rng, words=20):
+    return ' '.join(rng.choices(WORDS, k=rng.randint(1, words)))
+
+
+class PowerLaw:
+    """Случайный выбор элементов с весами 1 / rank ** exponent.
+
+    Ранги раздаются в случайном порядке, поэтому популярные элементы не
+    совпадают с первыми id.
+    """
+
+    def __init__(self, items, rng, exponent=1.0):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.rng = rng
+        self.weights = [
+            1 / rank ** exponent for rank in range(1, len(self.items) + 1)
+        ]
+        self.cum_weights = list(accumulate(self.weights))
+
+    def choices(self, k):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=k)
+
+    def stream(self, count, chunk=10000):
+        while count > 0:
+            yield from self.choices(min(chunk, count))
+            count -= chunk
+
+    def shares(self, total, cap):
+        """Делит total между элементами пропорционально весам.
+
+        Доля не больше cap, излишек достается следующим по рангу.
+        """
+        weight_left = self.cum_weights[-1]
+        for item, weight in zip(self.items, self.weights):
+            share = min(round(total * weight / weight_left), cap, total)
+            yield item, share
+            total -= share
+            weight_left -= weight
+
+
+def seed_users(count, password='password', prefix='user_'):
+    start = User.objects.filter(username__startswith=prefix).count()
+    password = make_password(password)
+    return bulk_insert(User, (
+        User(username=f'{prefix}{number}', password=password)
+        for number in range(start + 1, start + count + 1)
+    ))
+
+
+def seed_groups(count, prefix='group_'):
+    start = Group.objects.filter(slug__startswith=prefix).count()
+    return bulk_insert(Group, (
+        Group(
+            title=f'Группа {number}',
+            slug=f'{prefix}{number}',
+            description='Группа для нагрузочных данных',
+        )
+        for number in range(start + 1, start + count + 1)
+    ))
+
+
+def seed_posts(count, rng, exponent=1.0):
+    """Посты авторов, активность которых распределена степенно."""
+    authors = PowerLaw(User.objects.values_list('id', flat=True), rng,
+                       exponent)
+    groups = [None, *Group.objects.values_list('id', flat=True)]
+    return bulk_insert(Post, (
+        Post(
+            author_id=author_id,
+            group_id=rng.choice(groups),
+            text=random_text(rng),
+        )
+        for author_id in authors.stream(count)
+    ))
+
+
+def follow_pairs(users, count, rng, exponent):
+    authors = PowerLaw(users, rng, exponent)
+    followers = PowerLaw(users, rng, exponent)
+    for user_id, share in followers.shares(count, len(users) - 1):
+        followed = set()
+        for _ in range(3):
+            followed.update(
+                author_id for author_id in authors.choices(share)
+                if author_id != user_id
+            )
+            if len(followed) >= share:
+                break
+        else:
+            # Хвост распределения почти не выпадает, добираем равномерно.
+            rest = [
+                author_id for author_id in users
+                if author_id != user_id and author_id not in followed
+            ]
+            followed.update(rng.sample(rest, share - len(followed)))
+        for author_id in islice(followed, share):
+            yield user_id, author_id
+
+
+def seed_follows(count, rng, exponent=1.0):
+    """Граф подписок со степенным распределением подписчиков авторов.
+
+    Исходящие подписки тоже распределены степенно: большинство
+    пользователей читают нескольких авторов, немногие - сотни.
+    """
+    users = list(User.objects.values_list('id', flat=True))
+    return bulk_insert(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in follow_pairs(users, count, rng, exponent)
+    ))
+
+
+def seed_comments(count, rng, exponent=1.0):
+    """Комментарии, собранные в основном под популярными постами."""
+    posts = PowerLaw(Post.objects.values_list('id', flat=True), rng,
+                     exponent)
+    authors = PowerLaw(User.objects.values_list('id', flat=True), rng,
+                       exponent)
+    return bulk_insert(Comment, (
+        Comment(
+            post_id=post_id,
+            author_id=author_id,
+            text=random_text(rng, 10),
+        )
+        for post_id, author_id in zip(
+            posts.stream(count), authors.stream(count))
+    ))
+
+
+def finish(search_index=True):
+    """Досчитывает то, что bulk_create делает в обход сигналов."""
+    rebuild_counters()
+    rebuild_feeds()
+    rebuild_hot_scores()
+    if search_index:
+        rebuild_index()
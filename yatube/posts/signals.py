@@ -0,0 +1,220 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_feeds, bump_version
+from .counters import (change_group_counters, change_post_counter,
+                       change_profile_counter, touch_group)
+from .events import publish_post
+from .feed import fan_out_post
+from .hot import add_comment_score, post_score
+from .models import (Comment, Follow, Group, GroupStats, Post, Profile,
+                     Tombstone)
+from .recommendations import update_on_follow
+from .search import get_index
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def push_post_to_feeds(sender, instance, created, **kwargs):
+    if created and settings.FOLLOW_FEED_FANOUT:
+        fan_out_post(instance)
+
+
+@receiver(post_save, sender=Post)
+def publish_new_post(sender, instance, created, **kwargs):
+    if created and settings.EVENTS_ENABLED:
+        slug = instance.group.slug if instance.group_id else None
+        transaction.on_commit(lambda: publish_post(instance, slug))
+
+
+@receiver(post_save, sender=Post)
+def increment_posts_count(sender, instance, created, **kwargs):
+    if created:
+        change_profile_counter(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_delete, sender=Post)
+def decrement_posts_count(sender, instance, **kwargs):
+    change_profile_counter(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Group)
+def create_group_stats(sender, instance, created, **kwargs):
+    if created:
+        GroupStats.objects.get_or_create(group=instance)
+
+
+@receiver(post_save, sender=Post)
+def change_group_posts_count(sender, instance, created, **kwargs):
+    if created:
+        change_group_counters(
+            instance.group_id, instance.author_id, 1, instance.pub_date)
+        return
+    old_group_id = getattr(instance, '_old_group_id', instance.group_id)
+    if old_group_id != instance.group_id:
+        change_group_counters(old_group_id, instance.author_id, -1)
+        change_group_counters(
+            instance.group_id, instance.author_id, 1, timezone.now())
+
+
+@receiver(post_delete, sender=Post)
+def decrement_group_posts_count(sender, instance, **kwargs):
+    change_group_counters(instance.group_id, instance.author_id, -1)
+
+
+@receiver(pre_save, sender=Post)
+def score_new_post(sender, instance, **kwargs):
+    if instance.pk is None:
+        instance.hot_score = post_score(instance.pub_date or timezone.now())
+
+
+@receiver(post_save, sender=Comment)
+def score_comment(sender, instance, created, **kwargs):
+    if created:
+        add_comment_score(instance)
+        bump_feeds('hot')
+
+
+@receiver(post_save, sender=Comment)
+def increment_comments_count(sender, instance, created, **kwargs):
+    if created:
+        change_post_counter(instance.post_id, 1)
+
+
+@receiver(post_save, sender=Comment)
+def touch_comment_group(sender, instance, created, **kwargs):
+    if created and touch_group(instance.post_id, instance.created):
+        bump_feeds('groups')
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comments_count(sender, instance, **kwargs):
+    change_post_counter(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def increment_follow_counts(sender, instance, created, **kwargs):
+    if created:
+        change_profile_counter(instance.author_id, 'followers_count', 1)
+        change_profile_counter(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_save, sender=Follow)
+def update_recommendations(sender, instance, created, **kwargs):
+    if created:
+        update_on_follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def decrement_follow_counts(sender, instance, **kwargs):
+    change_profile_counter(instance.author_id, 'followers_count', -1)
+    change_profile_counter(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_card(sender, instance, **kwargs):
+    bump_version('post', instance.pk)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_cards(sender, instance, **kwargs):
+    bump_version('group', instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_author_cards(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version('user', instance.pk)
+    if not kwargs.get('created'):
+        bump_feeds('all')
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, **kwargs):
+    if instance.pk is None:
+        return
+    instance._old_group_id = Post.objects.filter(
+        pk=instance.pk
+    ).values_list('group_id', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    group_ids = {instance.group_id, getattr(instance, '_old_group_id', None)}
+    slugs = Group.objects.filter(pk__in=group_ids).values_list(
+        'slug', flat=True)
+    username = User.objects.filter(pk=instance.author_id).values_list(
+        'username', flat=True).first()
+    bump_feeds(
+        'index',
+        f'profile:{username}',
+        f'author:{instance.author_id}',
+        *(f'group:{slug}' for slug in slugs),
+        *(('groups',) if slugs else ())
+    )
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    bump_feeds('all')
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_profile_feed(sender, instance, **kwargs):
+    username = User.objects.filter(pk=instance.author_id).values_list(
+        'username', flat=True).first()
+    bump_feeds(f'profile:{username}', f'follow:{instance.user_id}')
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    bump_version('comments', instance.post_id)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def record_tombstone(sender, instance, **kwargs):
+    kind = Tombstone.POST if sender is Post else Tombstone.COMMENT
+    Tombstone.objects.create(kind=kind, object_id=instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields and 'text' not in update_fields:
+        return
+    get_index().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    get_index().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    if created:
+        get_index().add_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_index().remove_comment(instance)
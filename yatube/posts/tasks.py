@@ -0,0 +1,21 @@
+from core.tasks import task
+
+from .caching import bump_feeds
+from .feed import insert_post_entries
+from .models import Post
+from .thumbnails import abandon_renditions, make_renditions
+
+
+@task('posts.renditions', on_failure=abandon_renditions)
+def renditions(post_id, name):
+    make_renditions(post_id, name)
+
+
+@task('posts.fan_out', priority=5)
+def fan_out(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return
+    followers = insert_post_entries(post_id, author_id)
+    bump_feeds(*(f'follow:{user_id}' for user_id in followers))
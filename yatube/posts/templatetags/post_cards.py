@@ -0,0 +1,26 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from core.perf import count_cache
+
+from ..caching import post_card_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_card(post, author_link=''):
+    """Карточка поста из includes/article.html с кэшированием."""
+    key = post_card_key(post, author_link)
+    card = cache.get(key)
+    count_cache(card is not None)
+    if card is None:
+        card = render_to_string(
+            'includes/article.html',
+            {'post': post, 'author_link': author_link}
+        )
+        cache.set(key, card, settings.POST_CARD_CACHE_TIMEOUT)
+    return mark_safe(card)
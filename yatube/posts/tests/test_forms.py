@@ -1,12 +1,18 @@
+import os
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
+from ..forms import PostForm
 from ..models import Post
+from ..thumbnails import submit_renditions
 from .utils import YatubeTestConstructor
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -63,11 +69,32 @@ class PostsFormTests(TestCase):
             (form_data['text'], new_post.text),
             (group_2, new_post.group),
             (self.user, new_post.author),
-            ('posts/small.gif', new_post.image.name)
+            ('posts/small.jpg', new_post.image.name),
+            (True, new_post.thumbnails_pending),
         )
         for expected_name, test_name in compared_names:
             with self.subTest(expected_name=expected_name):
                 self.assertEqual(expected_name, test_name)
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': new_post.id}))
+        self.assertContains(response, 'Изображение обрабатывается')
+
+    @override_settings(THUMBNAIL_PREGENERATE='sync')
+    def test_thumbnails_pregenerated(self):
+        """Миниатюры создаются заранее и пост снимает отметку"""
+        post = Post.objects.create(
+            author=self.user,
+            text='Пост с картинкой',
+            image=PostsFormTests.test_gif_1,
+            thumbnails_pending=True
+        )
+        submit_renditions(post.pk, post.image.name)
+        post.refresh_from_db()
+        self.assertFalse(post.thumbnails_pending)
+        self.assertTrue(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'cache')))
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+        self.assertNotContains(response, 'Изображение обрабатывается')
 
     def test_post_edit(self):
         """Проверка редактирования"""
@@ -94,8 +121,65 @@ class PostsFormTests(TestCase):
             (form_data['text'], edit_post_text),
             (group_2, edit_post_group),
             (self.user, edit_post_author),
-            ('posts/small.gif', Post.objects.last().image.name)
+            ('posts/small.jpg', Post.objects.last().image.name)
         )
         for expected_name, test_name in compared_names:
             with self.subTest(expected_name=expected_name):
                 self.assertEqual(expected_name, test_name)
+
+
+class PostImageUploadTests(TestCase):
+    @staticmethod
+    def get_upload(name, image, image_format, **params):
+        file_obj = BytesIO()
+        image.save(file_obj, image_format, **params)
+        return SimpleUploadedFile(name, file_obj.getvalue())
+
+    def get_form(self, upload):
+        return PostForm(data={'text': 'Текст'}, files={'image': upload})
+
+    def test_large_photo_is_downscaled(self):
+        """Большое фото уменьшается, пересохраняется в JPEG без EXIF"""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        upload = self.get_upload(
+            'photo.png',
+            Image.new('RGB', (6000, 4000), (200, 30, 30)),
+            'JPEG',
+            exif=exif.tobytes(),
+        )
+        form = self.get_form(upload)
+        self.assertTrue(form.is_valid(), form.errors)
+        image_file = form.cleaned_data['image']
+        self.assertEqual(image_file.name, 'photo.jpg')
+        image = Image.open(image_file)
+        self.assertEqual(image.format, 'JPEG')
+        self.assertEqual(max(image.size), settings.POST_IMAGE_MAX_SIDE)
+        self.assertEqual(dict(image.getexif()), {})
+
+    def test_transparent_image_kept_as_png(self):
+        """Картинка с прозрачностью сохраняется в PNG"""
+        upload = self.get_upload(
+            'logo.gif', Image.new('RGBA', (50, 50), (0, 0, 0, 0)), 'PNG')
+        form = self.get_form(upload)
+        self.assertTrue(form.is_valid(), form.errors)
+        self.assertEqual(form.cleaned_data['image'].name, 'logo.png')
+
+    def test_too_many_pixels_rejected(self):
+        """Картинка больше лимита пикселей отклоняется по заголовку"""
+        upload = self.get_upload(
+            'huge.png', Image.new('1', (10000, 6000)), 'PNG')
+        form = self.get_form(upload)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'too_many_pixels')
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_too_large_file_rejected(self):
+        """Файл больше лимита отклоняется до открытия картинки"""
+        upload = self.get_upload(
+            'noise.png', Image.effect_noise((100, 100), 50), 'PNG')
+        form = self.get_form(upload)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors.as_data()['image'][0].code,
+                         'file_too_large')
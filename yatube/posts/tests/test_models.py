@@ -1,6 +1,19 @@
+import os
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, models
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 
+from ..models import (Comment, FeedEntry, Follow, Group, GroupAuthor,
+                      GroupStats, Post, Profile)
+from ..recommendations import build_recommendations
 from .utils import YatubeTestConstructor
 
 User = get_user_model()
@@ -30,3 +43,374 @@ class PostGroupModelTest(TestCase):
         for expected_name, test_model in compared_names:
             with self.subTest(expected_name=expected_name):
                 self.assertEqual(expected_name, test_model)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(2)
+        test_shell.create_groups()
+        test_shell.create_posts(3)
+        cls.user_1, cls.user_2 = test_shell.get_users()
+
+    def test_counters_follow_changes(self):
+        """Счетчики обновляются при создании и удалении объектов"""
+        post = Post.objects.create(author=self.user_1, text='Новый пост')
+        comment = Comment.objects.create(
+            post=post, author=self.user_2, text='Коментарий')
+        follow = Follow.objects.create(user=self.user_2, author=self.user_1)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        compared_counts = (
+            (Profile.objects.get(user=self.user_1).posts_count, 4),
+            (Profile.objects.get(user=self.user_1).followers_count, 1),
+            (Profile.objects.get(user=self.user_2).following_count, 1),
+        )
+        for count, expected in compared_counts:
+            with self.subTest(expected=expected):
+                self.assertEqual(count, expected)
+        comment.delete()
+        follow.delete()
+        post.delete()
+        profile_1 = Profile.objects.get(user=self.user_1)
+        self.assertEqual(profile_1.posts_count, 3)
+        self.assertEqual(profile_1.followers_count, 0)
+        self.assertEqual(
+            Profile.objects.get(user=self.user_2).following_count, 0)
+
+    def test_rebuild_counters_command(self):
+        """Команда rebuild_counters исправляет разошедшиеся счетчики"""
+        post = Post.objects.filter(author=self.user_1).first()
+        Comment.objects.create(post=post, author=self.user_2, text='Текст')
+        Profile.objects.update(posts_count=100, followers_count=100)
+        Post.objects.update(comments_count=100)
+        url = reverse('posts:profile', args=(self.user_1.username,))
+        etag = Client().get(url)['ETag']
+        call_command('rebuild_counters', stdout=StringIO())
+        response = Client().get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Всего постов: 3')
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Profile.objects.get(user=self.user_1).posts_count, 3)
+        self.assertEqual(
+            Profile.objects.get(user=self.user_1).followers_count, 0)
+
+
+class GroupStatsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(2)
+        test_shell.create_groups(2)
+        test_shell.create_posts(2)
+        cls.user_1, cls.user_2 = test_shell.get_users()
+        cls.group_1, cls.group_2 = Group.objects.order_by('pk')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_stats(self, group):
+        return GroupStats.objects.get(group=group)
+
+    def test_stats_follow_posts(self):
+        """Статистика группы обновляется при создании, переносе и
+        удалении постов"""
+        stats = self.get_stats(self.group_1)
+        self.assertEqual((stats.posts_count, stats.authors_count), (2, 2))
+        post = Post.objects.create(
+            author=self.user_1, text='Пост', group=self.group_1)
+        stats = self.get_stats(self.group_1)
+        self.assertEqual((stats.posts_count, stats.authors_count), (3, 2))
+        self.assertEqual(stats.last_activity, post.pub_date)
+        post.group = self.group_2
+        post.save()
+        self.assertEqual(self.get_stats(self.group_1).posts_count, 2)
+        self.assertEqual(self.get_stats(self.group_2).posts_count, 3)
+        Post.objects.filter(
+            author=self.user_1, group=self.group_1).get().delete()
+        stats = self.get_stats(self.group_1)
+        self.assertEqual((stats.posts_count, stats.authors_count), (1, 1))
+        self.assertFalse(GroupAuthor.objects.filter(
+            group=self.group_1, author=self.user_1).exists())
+
+    def test_deleted_author_leaves_group(self):
+        """Удаление автора убирает его посты и его самого из статистики"""
+        User.objects.get(pk=self.user_1.pk).delete()
+        stats = self.get_stats(self.group_1)
+        self.assertEqual((stats.posts_count, stats.authors_count), (1, 1))
+
+    def test_comment_updates_activity(self):
+        """Комментарий обновляет последнюю активность группы"""
+        post = Post.objects.filter(group=self.group_1).first()
+        comment = Comment.objects.create(
+            post=post, author=self.user_2, text='Комментарий')
+        self.assertEqual(
+            self.get_stats(self.group_1).last_activity, comment.created)
+
+    def test_new_group_has_stats(self):
+        """Новая группа сразу получает пустую статистику"""
+        group = Group.objects.create(title='Новая', slug='new_group')
+        stats = self.get_stats(group)
+        self.assertEqual((stats.posts_count, stats.authors_count), (0, 0))
+        self.assertIsNone(stats.last_activity)
+
+    def test_rebuild_matches_signals(self):
+        """Сверка дает ту же статистику, что и сигналы"""
+        post = Post.objects.create(
+            author=self.user_1, text='Пост', group=self.group_2)
+        Comment.objects.create(post=post, author=self.user_2, text='Текст')
+        fields = ('group_id', 'posts_count', 'authors_count', 'last_activity')
+        expected = list(
+            GroupStats.objects.order_by('group_id').values_list(*fields))
+        GroupStats.objects.update(posts_count=100, last_activity=None)
+        GroupAuthor.objects.all().delete()
+        call_command('rebuild_counters', stdout=StringIO())
+        self.assertEqual(
+            list(GroupStats.objects.order_by('group_id').values_list(
+                *fields)),
+            expected
+        )
+
+    def test_group_index_queries(self):
+        """Число запросов страницы групп не зависит от числа постов"""
+        url = reverse('posts:group_index')
+        with CaptureQueriesContext(connection) as before:
+            response = Client().get(url)
+        self.assertEqual(len(response.context['groups']), 2)
+        self.assertEqual(
+            response.context['groups'][0].stats.posts_count, 2)
+        for number in range(5):
+            Post.objects.create(
+                author=self.user_2, text=f'Пост {number}', group=self.group_2)
+        cache.clear()
+        with CaptureQueriesContext(connection) as after:
+            response = Client().get(url)
+        self.assertEqual(len(before), len(after))
+        self.assertEqual(response.context['groups'][0], self.group_2)
+
+
+class BulkLoadTest(TestCase):
+    def test_bulk_load_matches_signals(self):
+        """Массовая загрузка дает те же счетчики и ленты, что и сигналы"""
+        test_shell = YatubeTestConstructor()
+        test_shell.bulk_create_users(20)
+        test_shell.create_groups(3)
+        test_shell.bulk_create_posts(100)
+        test_shell.bulk_create_follows(60)
+        test_shell.bulk_create_comments(200)
+        test_shell.finish_bulk_load()
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertFalse(
+            Follow.objects.filter(user=models.F('author')).exists())
+        self.assertEqual(
+            sum(Profile.objects.values_list('posts_count', flat=True)), 100)
+        self.assertEqual(
+            sum(Post.objects.values_list('comments_count', flat=True)), 200)
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Post.objects.filter(author__following__isnull=False).count()
+        )
+
+    def test_seed_command(self):
+        """Команда seed_yatube заполняет базу с общим хэшем пароля"""
+        call_command(
+            'seed_yatube',
+            users=30,
+            groups=2,
+            posts=50,
+            follows=100,
+            comments=80,
+            stdout=StringIO(),
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Profile.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 50)
+        self.assertEqual(Follow.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(
+            User.objects.values('password').distinct().count(), 1)
+        self.assertTrue(User.objects.first().check_password('password'))
+        followers = sorted(
+            Profile.objects.values_list('followers_count', flat=True))
+        self.assertGreater(followers[-1], 3 * followers[len(followers) // 2])
+
+    def test_import_follows_command(self):
+        """import_follows загружает CSV и JSONL, пропуская чужие строки"""
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(3)
+        test_shell.create_posts(2)
+        user_1, user_2, user_3 = test_shell.get_users()
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path = os.path.join(directory, 'follows.csv')
+            with open(csv_path, 'w') as file:
+                file.write(
+                    f'{user_1.username},{user_2.username}\n'
+                    f'{user_1.username},{user_1.username}\n'
+                    f'{user_1.username},nobody\n'
+                    f'{user_1.username},{user_2.username}\n'
+                )
+            jsonl_path = os.path.join(directory, 'follows.jsonl')
+            with open(jsonl_path, 'w') as file:
+                file.write(f'{{"user": {user_2.pk}, "author": {user_3.pk}}}\n')
+                file.write(f'[{user_3.pk}, 100500]\n')
+            call_command('import_follows', csv_path, stdout=StringIO())
+            call_command(
+                'import_follows', jsonl_path, ids=True, stdout=StringIO())
+        self.assertEqual(
+            set(Follow.objects.values_list('user', 'author')),
+            {(user_1.pk, user_2.pk), (user_2.pk, user_3.pk)}
+        )
+        self.assertEqual(Profile.objects.get(user=user_2).followers_count, 1)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=user_1).count(), 2)
+
+    def test_import_follows_errors(self):
+        """import_follows сообщает номер испорченной строки"""
+        with tempfile.TemporaryDirectory() as directory:
+            for name, content, ids in (
+                ('follows.jsonl', '[1, 2]\n{"user": 1\n', False),
+                ('follows.jsonl', '[1, 2]\n{"user": 1}\n', False),
+                ('follows.csv', '1,2\nfirst,second\n', True),
+            ):
+                path = os.path.join(directory, name)
+                with open(path, 'w') as file:
+                    file.write(content)
+                with self.subTest(content=content):
+                    with self.assertRaisesMessage(CommandError, 'Строка 2'):
+                        call_command(
+                            'import_follows', path, ids=ids,
+                            stdout=StringIO())
+
+
+class RecommendationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(5)
+        cls.users = test_shell.get_users()
+        user_1, user_2, user_3, user_4, user_5 = cls.users
+        Follow.objects.bulk_create(
+            Follow(user=user, author=author) for user, author in (
+                (user_1, user_2),
+                (user_2, user_3),
+                (user_4, user_2),
+                (user_4, user_5),
+                (user_5, user_3),
+            )
+        )
+
+    def recommended(self, user):
+        return list(
+            user.recommendations.order_by('-score')
+            .values_list('author__username', flat=True)
+        )
+
+    def test_build(self):
+        """Рекомендации: друзья друзей выше, без себя и своих авторов"""
+        user_1, user_2, user_3, user_4, user_5 = self.users
+        call_command('build_recommendations', stdout=StringIO())
+        recommended = self.recommended(user_1)
+        self.assertEqual(recommended[0], user_3.username)
+        self.assertIn(user_5.username, recommended)
+        self.assertNotIn(user_1.username, recommended)
+        self.assertNotIn(user_2.username, recommended)
+        self.assertEqual(
+            self.recommended(User.objects.create_user('newbie')), [])
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(
+            self.recommended(User.objects.get(username='newbie'))[:2],
+            [user_2.username, user_3.username]
+        )
+
+    def test_update_on_follow(self):
+        """Новая подписка убирает автора и добавляет его авторов"""
+        user_1, user_2, user_3, user_4, user_5 = self.users
+        build_recommendations()
+        Follow.objects.create(user=user_1, author=user_5)
+        recommended = self.recommended(user_1)
+        self.assertNotIn(user_5.username, recommended)
+        self.assertEqual(recommended[0], user_3.username)
+        reader = User.objects.create_user('reader')
+        with self.settings(RECOMMENDATIONS_COUNT=1):
+            Follow.objects.create(user=reader, author=user_4)
+        self.assertEqual(len(self.recommended(reader)), 1)
+
+    def test_pages_show_recommendations(self):
+        """Рекомендации выводятся на страницах профиля и подписок"""
+        user_1, user_2, user_3, user_4, user_5 = self.users
+        build_recommendations()
+        client = Client()
+        client.force_login(user_1)
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=(user_2.username,)),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertIn(
+                    user_3, response.context['recommendations'])
+                self.assertContains(response, 'Кого почитать')
+
+    def test_rebuild_refreshes_pages(self):
+        """Пересчет рекомендаций меняет ETag страницы подписок"""
+        user_1 = self.users[0]
+        client = Client()
+        client.force_login(user_1)
+        url = reverse('posts:follow_index')
+        etag = client.get(url)['ETag']
+        build_recommendations()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.users[2], response.context['recommendations'])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN есть в SQLite')
+class IndexesTest(TestCase):
+    HOT_TABLES = ('posts_post', 'posts_comment', 'posts_follow')
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(2)
+        test_shell.create_groups()
+        test_shell.create_posts(3)
+        cls.user_1, cls.user_2 = test_shell.get_users()
+        cls.group, = test_shell.get_groups()
+        cls.post = test_shell.get_posts()[0]
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user_2)
+        cache.clear()
+
+    def get_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = [row[-1] for row in cursor.fetchall()]
+        return [
+            step for step in plan
+            if step.startswith('SCAN')
+            and step.split()[1] in self.HOT_TABLES
+        ]
+
+    def test_views_use_indexes(self):
+        """Запросы страниц используют индексы, а не полный перебор"""
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user_1}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.id}),
+            reverse('posts:post_comments', kwargs={'post_id': self.post.id})
+            + '?after=0-0',
+            reverse('posts:follow_index'),
+        )
+        for url in urls:
+            with CaptureQueriesContext(connection) as queries:
+                self.authorized_client.get(url)
+            for query in queries.captured_queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertEqual(self.get_scans(query['sql']), [])
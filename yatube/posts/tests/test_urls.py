@@ -44,6 +44,9 @@ class PostsFormTests(TestCase):
             (self.authorized_client_1, reverse(
                 'posts:post_edit', kwargs={'post_id': '1'})),
             (self.authorized_client_1, reverse('posts:follow_index')),
+            (self.guest_client, reverse('posts:search') + '?q=post'),
+            (self.guest_client, reverse('posts:hot')),
+            (self.guest_client, reverse('posts:group_index')),
         )
         for client, url in client_url_names:
             with self.subTest(url=url):
@@ -99,7 +102,10 @@ class PostsFormTests(TestCase):
             ('posts/create_post.html', reverse('posts:post_create')),
             ('posts/create_post.html', reverse(
                 'posts:post_edit', kwargs={'post_id': '1'})),
-            ('posts/follow.html', reverse('posts:follow_index'))
+            ('posts/follow.html', reverse('posts:follow_index')),
+            ('posts/search.html', reverse('posts:search')),
+            ('posts/hot.html', reverse('posts:hot')),
+            ('posts/groups.html', reverse('posts:group_index')),
         )
         for template, url in template_url_names:
             with self.subTest(url=url):
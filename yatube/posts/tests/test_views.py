@@ -1,19 +1,43 @@
 import shutil
+import sqlite3
 import tempfile
+from http import HTTPStatus
 from math import ceil
+from unittest import mock, skipUnless
 
 from django import forms
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
-from django.test import Client, TestCase, override_settings
+from django.core.paginator import EmptyPage
+from django.db import connection
+from django.test import Client, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Comment, Follow, Post
+from ..events import LocalBroker, get_broker, publish_post
+from ..feed import get_follow_feed, rebuild_feeds
+from ..hot import rebuild_hot_scores
+from ..models import Comment, FeedEntry, Follow, Post
+from ..utils import add_paginator
 from .utils import YatubeTestConstructor
 
+User = get_user_model()
+
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+def has_fts5():
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE search USING fts5(text)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostsFormTests(TestCase):
     @classmethod
@@ -164,6 +188,48 @@ class PostsFormTests(TestCase):
         comments = response.context.get('comments')
         self.assertIn(comment, comments)
 
+    @override_settings(COMMENTS_PAGE_SIZE=5)
+    def test_comments_pagination(self):
+        """Комментарии подгружаются страницами по курсору"""
+        post = PostsFormTests.posts[0]
+        Comment.objects.bulk_create(
+            Comment(post=post, author=self.user_2, text=f'Коментарий {i}')
+            for i in range(12)
+        )
+        expected = list(
+            post.comments.order_by('created', 'id').values_list(
+                'id', flat=True))
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.id}))
+        ids = [comment.id for comment in response.context.get('comments')]
+        cursor = response.context.get('comments_next')
+        url = reverse('posts:post_comments', kwargs={'post_id': post.id})
+        self.assertContains(response, f'{url}?after={cursor}')
+        while cursor:
+            with self.assertNumQueries(2):
+                response = self.guest_client.get(
+                    url, {'after': cursor, 'format': 'json'})
+            data = response.json()
+            ids += [comment['id'] for comment in data['comments']]
+            cursor = data['next']
+        self.assertEqual(ids, expected)
+        response = self.guest_client.get(url)
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(len(response.context.get('comments')), 5)
+
+    def test_out_of_range_comment_cursor(self):
+        """Курсор за пределами дат считается отсутствующим"""
+        post = PostsFormTests.posts[0]
+        urls = (
+            reverse('posts:post_comments', kwargs={'post_id': post.id}),
+            reverse('posts:post_detail', kwargs={'post_id': post.id}),
+        )
+        for url in urls:
+            for cursor in ('99999999999999999999-1', '-1-1'):
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.guest_client.get(url, {'after': cursor})
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+
     def test_post_create_show_correct_form(self):
         """Шаблон post_create сформирован с правильной формой."""
         response = self.authorized_client_1.get(
@@ -239,6 +305,92 @@ class PostsFormTests(TestCase):
                     response.context.get('page_obj')),
                     amount_of_posts_on_pages[page])
 
+    def test_keyset_paginator(self):
+        """Пагинатор по курсору обходит все посты без COUNT и OFFSET"""
+        url = reverse('posts:index')
+        expected_ids = list(Post.objects.values_list('id', flat=True))
+        ids = []
+        query = ''
+        for page in range(PostsFormTests.AMOUNT_PAGES):
+            with self.subTest(page=page + 1):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.guest_client.get(url + query)
+                for executed in queries.captured_queries:
+                    self.assertNotIn('COUNT(', executed['sql'])
+                    self.assertNotIn('OFFSET', executed['sql'])
+                paginator = response.context.get('page_obj').paginator
+                ids += [post.id for post in response.context.get('page_obj')]
+                query = '?after=' + str(paginator.next_cursor)
+        self.assertEqual(ids, expected_ids)
+        self.assertFalse(paginator.has_next)
+        response = self.guest_client.get(
+            url + '?before=' + str(paginator.previous_cursor))
+        self.assertEqual(
+            [post.id for post in response.context.get('page_obj')],
+            expected_ids[
+                settings.MAX_PAGE_AMOUNT:settings.MAX_PAGE_AMOUNT * 2]
+        )
+
+    def test_keyset_page_api_without_count(self):
+        """Методы страницы курсорного пагинатора не делают запросов"""
+        page_obj = add_paginator(RequestFactory().get('/'), Post.objects)
+        with self.assertNumQueries(0):
+            self.assertTrue(page_obj.has_next())
+            self.assertFalse(page_obj.has_previous())
+            self.assertTrue(page_obj.has_other_pages())
+            self.assertEqual(page_obj.next_page_number(), 2)
+            with self.assertRaises(EmptyPage):
+                page_obj.previous_page_number()
+        last = Post.objects.order_by('id').first()
+        page_obj = add_paginator(
+            RequestFactory().get('/', {'after': last.id + 1}), Post.objects)
+        with self.assertNumQueries(0):
+            self.assertFalse(page_obj.has_next())
+            self.assertTrue(page_obj.has_previous())
+            self.assertEqual(page_obj.previous_page_number(), 1)
+            with self.assertRaises(EmptyPage):
+                page_obj.next_page_number()
+
+    def test_list_pages_query_count(self):
+        """Количество запросов на страницах лент не зависит от постов"""
+        self.authorized_client_1.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_2.username}
+        ))
+        cache.clear()
+        group_1 = PostsFormTests.group_1
+        client_url_queries = (
+            (self.guest_client, reverse('posts:index'), 1),
+            (self.guest_client, reverse(
+                'posts:group_list', kwargs={'slug': group_1.slug}), 2),
+            (self.guest_client, reverse(
+                'posts:profile', kwargs={'username': self.user_1}), 2),
+            (self.authorized_client_1, reverse('posts:follow_index'), 5),
+        )
+        for client, url, queries in client_url_queries:
+            with self.subTest(url=url):
+                with self.assertNumQueries(queries):
+                    response = client.get(url)
+                self.assertEqual(
+                    len(response.context.get('page_obj')),
+                    settings.MAX_PAGE_AMOUNT
+                )
+
+    def test_post_card_cache(self):
+        """Карточки постов кэшируются и сбрасываются при сохранении"""
+        url = reverse('posts:profile', kwargs={'username': self.user_1})
+        post = Post.objects.filter(author=self.user_1).first()
+        self.guest_client.get(url)
+        Post.objects.filter(pk=post.pk).update(text='Без сигнала')
+        self.assertNotContains(self.guest_client.get(url), 'Без сигнала')
+        post.text = 'Пост после правки'
+        post.save()
+        self.assertContains(self.guest_client.get(url), 'Пост после правки')
+        self.user_1.first_name = 'Новое'
+        self.user_1.last_name = 'Имя'
+        self.user_1.save()
+        self.assertContains(self.guest_client.get(url), 'Новое Имя')
+
     def test_cache(self):
         """Тестирование работы кэша index"""
         last_post = Post.objects.first()
@@ -246,15 +398,91 @@ class PostsFormTests(TestCase):
         last_post.save()
         self.guest_client.get(reverse(
             'posts:index') + '?page=1')
-        last_post.delete()
+        Post.objects.filter(pk=last_post.pk).update(text='Без сигнала')
         response_two = self.guest_client.get(reverse(
             'posts:index') + '?page=1')
         self.assertContains(response_two, last_post.text)
-        cache.clear()
+        last_post.delete()
         response_three = self.guest_client.get(reverse(
             'posts:index') + '?page=1')
         self.assertNotContains(response_three, last_post.text)
 
+    def test_cache_invalidation(self):
+        """Новые посты и правки сразу видны на закэшированных лентах"""
+        group_2 = PostsFormTests.group_2
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': group_2.slug}),
+            reverse('posts:profile', kwargs={'username': self.user_1}),
+        )
+        for url in urls:
+            self.guest_client.get(url)
+        post = Post.objects.create(
+            author=self.user_1,
+            text='Свежий пост',
+            group=group_2
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Свежий пост')
+        post.group = PostsFormTests.group_1
+        post.save()
+        self.assertNotContains(self.guest_client.get(urls[1]), 'Свежий пост')
+
+    def test_cache_recompute_lock(self):
+        """Пока страницу пересчитывает другой запрос, отдается прошлая
+        версия без обращений к базе"""
+        url = reverse('posts:index')
+        self.guest_client.get(url)
+        Post.objects.create(author=self.user_1, text='Свежий пост')
+        with mock.patch('posts.caching.cache.add', return_value=False):
+            with self.assertNumQueries(0):
+                response = self.guest_client.get(url)
+        self.assertNotContains(response, 'Свежий пост')
+        self.assertContains(self.guest_client.get(url), 'Свежий пост')
+
+    def test_conditional_get(self):
+        """Неизмененная страница отвечает 304 без ленты и шаблонов"""
+        post = Post.objects.filter(author=self.user_1).first()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group_2.slug}),
+            reverse('posts:profile', kwargs={'username': self.user_1}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                etag = self.guest_client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+                response = self.authorized_client_1.get(
+                    url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_conditional_get_invalidation(self):
+        """Новые посты и комментарии меняют ETag страниц"""
+        post = Post.objects.filter(author=self.user_1).first()
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:profile', kwargs={'username': self.user_1}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        etags = {url: self.guest_client.get(url)['ETag'] for url in urls}
+        Post.objects.create(author=self.user_1, text='Свежий пост')
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url])
+                self.assertEqual(response.status_code, HTTPStatus.OK)
+        etag = self.guest_client.get(urls[2])['ETag']
+        Comment.objects.create(
+            post=post, author=self.user_2, text='Комментарий')
+        response = self.guest_client.get(urls[2], HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий')
+
     def test_new_post_shows_for_sub(self):
         """Новая запись автора появляется в ленте тех, у подписчиков """
         group_2 = PostsFormTests.group_2
@@ -286,6 +514,61 @@ class PostsFormTests(TestCase):
         response = self.authorized_client_2.get(reverse('posts:follow_index'))
         self.assertNotIn(new_post, response.context.get('page_obj'))
 
+    def test_follow_feed_backfill_and_trim(self):
+        """Подписка заполняет ленту постами автора, отписка очищает"""
+        self.authorized_client_1.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': self.user_2.username}
+        ))
+        author_posts = list(self.user_2.posts_of_author.all())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.user_1).count(),
+            len(author_posts)
+        )
+        response = self.authorized_client_1.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            list(response.context.get('page_obj')),
+            author_posts[:settings.MAX_PAGE_AMOUNT]
+        )
+        self.authorized_client_1.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': self.user_2.username}
+        ))
+        self.assertFalse(FeedEntry.objects.filter(user=self.user_1).exists())
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=0)
+    def test_follow_feed_heavy_author_fallback(self):
+        """Посты популярных авторов читаются без рассылки по лентам"""
+        Follow.objects.create(
+            user=self.user_1,
+            author=self.user_2
+        )
+        new_post = Post.objects.create(
+            author=self.user_2,
+            text='Новый пост',
+        )
+        self.assertFalse(FeedEntry.objects.filter(post=new_post).exists())
+        response = self.authorized_client_1.get(reverse('posts:follow_index'))
+        self.assertIn(new_post, response.context.get('page_obj'))
+        response = self.authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertNotIn(new_post, response.context.get('page_obj'))
+
+    @override_settings(FOLLOW_FEED_FANOUT_LIMIT=1)
+    def test_follow_feed_keeps_posts_of_former_heavy_author(self):
+        """Посты, пропущенные рассылкой, не теряются, когда у автора
+        становится меньше подписчиков"""
+        reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=self.user_1, author=self.user_2)
+        Follow.objects.create(user=reader, author=self.user_2)
+        new_post = Post.objects.create(author=self.user_2, text='Новый пост')
+        self.assertIn(new_post, get_follow_feed(self.user_1))
+        Follow.objects.filter(user=reader, author=self.user_2).delete()
+        self.assertIn(new_post, get_follow_feed(self.user_1))
+        rebuild_feeds()
+        self.assertIn(new_post, get_follow_feed(self.user_1))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user_1, post=new_post).exists())
+
     def follow_is_created_correct(self):
         """Тестирование подписки"""
         follow_count = Follow.objects.all().count()
@@ -309,3 +592,228 @@ class PostsFormTests(TestCase):
             kwargs={'username': self.user_1.username}
         ))
         self.assertEqual(Follow.objects.all().count(), follow_count - 1)
+
+
+@skipUnless(has_fts5(), 'SQLite собран без FTS5')
+@override_settings(SEARCH_BACKEND='fts5')
+class FTS5SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(1)
+        test_shell.create_posts(12, text='Котики любят молоко')
+        cls.user, = test_shell.get_users()
+        cls.posts = test_shell.get_posts()
+        cls.url = reverse('posts:search')
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, cursor=''):
+        response = self.guest_client.get(
+            self.url, {'q': query, **dict([cursor] if cursor else [])})
+        return response.context.get('page_obj')
+
+    def test_search_word_forms(self):
+        """Поиск находит посты по другим формам слов"""
+        for query in ('котик', 'КОТИКАМИ', 'любил молоком'):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    len(self.search(query)), settings.MAX_PAGE_AMOUNT)
+        self.assertEqual(len(self.search('собаки')), 0)
+        self.assertEqual(len(self.search('котики собаки')), 0)
+        self.assertEqual(len(self.search('')), 0)
+
+    def test_search_ranking(self):
+        """Совпадение в тексте поста важнее совпадения в комментарии"""
+        in_text = Post.objects.create(
+            author=self.user, text='Бегемоты и бегемотик')
+        in_comment = Post.objects.create(author=self.user, text='Зоопарк')
+        Comment.objects.create(
+            post=in_comment, author=self.user, text='Там был бегемот')
+        self.assertEqual(list(self.search('бегемот')), [in_text, in_comment])
+
+    def test_search_index_updates(self):
+        """Индекс обновляется при изменении постов и комментариев"""
+        post = Post.objects.create(author=self.user, text='Первый текст')
+        self.assertEqual(list(self.search('первые')), [post])
+        comment = Comment.objects.create(
+            post=post, author=self.user, text='Отличная черепаха')
+        self.assertEqual(list(self.search('черепахи')), [post])
+        comment.delete()
+        self.assertEqual(list(self.search('черепахи')), [])
+        post.text = 'Второй текст'
+        post.save()
+        self.assertEqual(list(self.search('первые')), [])
+        self.assertEqual(list(self.search('вторая')), [post])
+        post.delete()
+        self.assertEqual(list(self.search('вторая')), [])
+
+    def test_search_paginator(self):
+        """Пагинатор поиска обходит все найденные посты по курсору"""
+        ids = []
+        cursor = ''
+        while True:
+            with CaptureQueriesContext(connection) as queries:
+                page_obj = self.search('молоко', cursor)
+            for executed in queries.captured_queries:
+                self.assertNotIn('OFFSET', executed['sql'])
+            ids += [post.id for post in page_obj]
+            if not page_obj.paginator.has_next:
+                break
+            cursor = ('after', page_obj.paginator.next_cursor)
+        self.assertCountEqual(ids, [post.id for post in self.posts])
+        self.assertEqual(len(set(ids)), len(ids))
+        page_obj = self.search(
+            'молоко', ('before', page_obj.paginator.previous_cursor))
+        self.assertEqual(
+            [post.id for post in page_obj], ids[:settings.MAX_PAGE_AMOUNT])
+
+
+@override_settings(SEARCH_BACKEND='terms')
+class TermsSearchTests(FTS5SearchTests):
+    pass
+
+
+@override_settings(
+    EVENTS_ENABLED=True, EVENTS_KEEPALIVE=0.01, EVENTS_STREAM_TIMEOUT=0.05)
+class EventsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        test_shell = YatubeTestConstructor()
+        test_shell.create_users(2)
+        test_shell.create_groups(1)
+        test_shell.create_posts(2)
+        cls.user_1, cls.user_2 = test_shell.get_users()
+        cls.group = test_shell.get_groups()[0]
+        cls.posts = list(Post.objects.order_by('id'))
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_broker(self):
+        """Подписчик получает событие один раз, отписавшийся - нет"""
+        broker = LocalBroker()
+        subscription = broker.subscribe(['index', 'author:1'])
+        closed = broker.subscribe(['index'])
+        closed.close()
+        broker.publish(['index', 'author:1'], {'id': 1})
+        self.assertEqual(subscription.get(0), {'id': 1})
+        self.assertIsNone(subscription.get(0))
+        self.assertIsNone(closed.get(0))
+        subscription.close()
+        self.assertEqual(broker.channels, {})
+
+    def test_stream(self):
+        """Поток отдает пропущенные и новые посты ленты"""
+        first, *newer = self.posts
+        response = self.guest_client.get(
+            reverse('posts:events'), {'feed': 'index', 'after': first.id})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = iter(response.streaming_content)
+        self.assertTrue(next(stream).startswith(b'retry:'))
+        for post in newer:
+            self.assertIn(f'id: {post.id}\n'.encode(), next(stream))
+        publish_post(first, self.group.slug)
+        self.assertIn(f'id: {first.id}\n'.encode(), next(stream))
+        self.assertIn(b': keepalive', b''.join(stream))
+
+    def test_stream_channels(self):
+        """Поток группы получает только посты группы"""
+        post = self.posts[0]
+        response = self.guest_client.get(
+            reverse('posts:events'), {'feed': 'group', 'slug': 'other'})
+        stream = iter(response.streaming_content)
+        next(stream)
+        publish_post(post, self.group.slug)
+        self.assertNotIn(b'event: post', b''.join(stream))
+
+    def test_follow_stream_requires_login(self):
+        """Поток подписок недоступен гостю"""
+        response = self.guest_client.get(
+            reverse('posts:events'), {'feed': 'follow'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_feed_pages_subscribe(self):
+        """Первая страница ленты подключает поток с id новейшего поста"""
+        response = self.guest_client.get(reverse('posts:index'))
+        events = reverse('posts:events')
+        self.assertContains(
+            response, f'{events}?feed=index&amp;after={self.posts[-1].id}')
+        response = self.guest_client.get(
+            reverse('posts:index'), {'after': self.posts[-1].id})
+        self.assertNotContains(response, reverse('posts:events'))
+
+    def test_unread_stream_does_not_subscribe(self):
+        """Подписка появляется только при чтении потока"""
+        response = self.guest_client.get(
+            reverse('posts:events'), {'feed': 'index'})
+        self.assertEqual(get_broker().channels, {})
+        stream = iter(response.streaming_content)
+        next(stream)
+        self.assertIn('index', get_broker().channels)
+        b''.join(stream)
+        self.assertEqual(get_broker().channels, {})
+
+    @override_settings(EVENTS_ENABLED=False)
+    def test_events_disabled(self):
+        """Без EVENTS_ENABLED поток и баннер новых постов выключены"""
+        response = self.guest_client.get(
+            reverse('posts:events'), {'feed': 'index'})
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+        cache.clear()
+        response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotContains(response, reverse('posts:events'))
+
+
+class HotFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='hot_author')
+        cls.posts = [
+            Post.objects.create(author=cls.user, text=f'Пост {number}')
+            for number in range(15)
+        ]
+
+    def setUp(self):
+        self.guest_client = Client()
+        cache.clear()
+
+    def test_comments_raise_score(self):
+        """Комментарии поднимают пост выше более свежих"""
+        old_post = self.posts[0]
+        for _ in range(3):
+            Comment.objects.create(
+                post=old_post, author=self.user, text='Комментарий')
+        response = self.guest_client.get(reverse('posts:hot'))
+        self.assertEqual(response.context['page_obj'][0], old_post)
+        scores = dict(Post.objects.values_list('id', 'hot_score'))
+        rebuild_hot_scores()
+        for post_id, score in Post.objects.values_list('id', 'hot_score'):
+            self.assertAlmostEqual(scores[post_id], score)
+
+    def test_hot_paginator(self):
+        """Пагинатор «Обсуждаемого» обходит все посты по курсору"""
+        url = reverse('posts:hot')
+        response = self.guest_client.get(url)
+        page_obj = response.context['page_obj']
+        ids = [post.id for post in page_obj]
+        response = self.guest_client.get(
+            url, {'after': page_obj.paginator.next_cursor})
+        ids += [post.id for post in response.context['page_obj']]
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-hot_score', '-id')
+                 .values_list('id', flat=True))
+        )
+        response = self.guest_client.get(
+            url,
+            {'before': response.context['page_obj'].paginator
+             .previous_cursor}
+        )
+        self.assertEqual(
+            [post.id for post in response.context['page_obj']],
+            ids[:settings.MAX_PAGE_AMOUNT]
+        )
@@ -1,9 +1,13 @@
+import random
 from itertools import cycle
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 
+from .. import seeding
+from ..counters import rebuild_counters
 from ..models import Group, Post
+from ..search import rebuild_index
 
 User = get_user_model()
 
@@ -51,11 +55,33 @@ class YatubeTestConstructor:
                     author=user,
                     text=text,
                 )
-                for user in self._users_models
+                for user in self._users
                 for post in range(posts_each_user)]
         Post.objects.bulk_create(posts)
+        rebuild_counters()
+        rebuild_index()
+        self._posts = Post.objects.all()
+
+    def bulk_create_users(self, users, password='password'):
+        """Создает пользователей пачками с одним общим хэшем пароля."""
+        seeding.seed_users(users, password)
+        self._users = User.objects.all()
+
+    def bulk_create_posts(self, posts, seed=0):
+        seeding.seed_posts(posts, random.Random(seed))
         self._posts = Post.objects.all()
 
+    def bulk_create_follows(self, follows, seed=0):
+        """Граф подписок со степенным распределением."""
+        seeding.seed_follows(follows, random.Random(seed))
+
+    def bulk_create_comments(self, comments, seed=0):
+        seeding.seed_comments(comments, random.Random(seed))
+
+    def finish_bulk_load(self):
+        """Досчитывает то, что bulk_create делает в обход сигналов."""
+        seeding.finish()
+
     def uploaded_test_gif(self):
         test_gif = (
             b'\x47\x49\x46\x38\x39\x61\x02\x00'
@@ -0,0 +1,72 @@
+import logging
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import get_thumbnail
+
+from core.perf import timer
+from core.tasks import enqueue
+
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+
+def generate_renditions(name):
+    """Создает все миниатюры из THUMBNAIL_RENDITIONS для картинки."""
+    for geometry, options in settings.THUMBNAIL_RENDITIONS:
+        get_thumbnail(name, geometry, **options)
+
+
+def finish_renditions(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None and post.thumbnails_pending:
+        post.thumbnails_pending = False
+        post.save(update_fields=('thumbnails_pending', 'updated_at'))
+
+
+def abandon_renditions(post_id, name):
+    """Миниатюры не создались: их нарисует sorl при первом показе."""
+    finish_renditions(post_id)
+
+
+def make_renditions(post_id, name):
+    generate_renditions(name)
+    finish_renditions(post_id)
+
+
+def submit_renditions(post_id, name):
+    if settings.THUMBNAIL_PREGENERATE == 'sync':
+        try:
+            with timer('thumbnail_ms'):
+                make_renditions(post_id, name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюры поста %s', post_id)
+            abandon_renditions(post_id, name)
+        return
+    enqueue(
+        'posts.renditions', post_id, name, key=f'renditions:{post_id}:{name}')
+
+
+def mark_pending(post, form):
+    """Отмечает пост, если в форме загружена новая картинка."""
+    if (
+        settings.THUMBNAIL_PREGENERATE
+        and 'image' in form.changed_data
+        and post.image
+    ):
+        post.thumbnails_pending = True
+
+
+def enqueue_renditions(post):
+    """Ставит создание миниатюр в очередь в транзакции сохранения поста,
+    а в режиме sync создает их после коммита."""
+    if not post.thumbnails_pending:
+        return
+    if settings.THUMBNAIL_PREGENERATE == 'sync':
+        transaction.on_commit(
+            partial(submit_renditions, post.pk, post.image.name)
+        )
+    else:
+        submit_renditions(post.pk, post.image.name)
@@ -1,8 +1,184 @@
+from datetime import datetime, timezone
+
 from django.conf import settings
-from django.core.paginator import Paginator
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+
+def key_filter(fields, values, lookup):
+    """Условие «ключ ``fields`` дальше ``values``» в порядке ``lookup``.
+
+    Для ключа (a, id) это ``a < x OR (a = x AND id < y)``.
+    """
+    condition = None
+    for field, value in reversed(list(zip(fields, values))):
+        further = Q(**{f'{field}__{lookup}': value})
+        if condition is not None:
+            further |= Q(**{field: value}) & condition
+        condition = further
+    return condition
+
+
+class KeysetPaginator(Paginator):
+    """Пагинатор по курсору без COUNT и OFFSET.
+
+    Строки идут по убыванию ключа ``key``, последним полем ключа служит
+    уникальный ``id``. Страница выбирается параметрами ``after``
+    (строки дальше курсора) или ``before`` (строки перед ним), поэтому
+    стоимость запроса не зависит от глубины страницы. Курсор - значения
+    ключа через двоеточие, ``key_types`` разбирают их из query string.
+    Наследники задают ключ и, если строки берутся не из QuerySet,
+    метод keyset(). ``params`` - префикс query string, который шаблон
+    добавляет к ссылкам на соседние страницы.
+
+    Номер страницы относительный: 1 - первая, 2 - любая следующая. Его
+    и num_pages хватает методам Page (has_next, next_page_number и
+    другим), и они не считают COUNT(*).
+    """
+    is_keyset = True
+    params = ''
+    key = ('id',)
+    key_types = (int,)
+
+    def __init__(self, object_list, per_page):
+        super().__init__(object_list, per_page)
+        self.has_next = False
+        self.has_previous = False
+        self.next_cursor = None
+        self.previous_cursor = None
+
+    @property
+    def num_pages(self):
+        return 1 + self.has_previous + self.has_next
+
+    def parse_cursor(self, value):
+        if value is None:
+            return None
+        values = str(value).split(':')
+        if len(values) != len(self.key_types):
+            return None
+        try:
+            return tuple(
+                parse(value) for parse, value in zip(self.key_types, values))
+        except ValueError:
+            return None
+
+    def row_cursor(self, row):
+        values = [getattr(row, field) for field in self.key]
+        if len(values) == 1:
+            return values[0]
+        return ':'.join(map(repr, values))
+
+    def keyset(self, cursor, reverse=False):
+        """До per_page + 1 строк за курсором по убыванию ключа или,
+        с ``reverse``, перед ним по возрастанию."""
+        sign = '' if reverse else '-'
+        queryset = self.object_list.order_by(
+            *(sign + field for field in self.key))
+        if cursor is not None:
+            queryset = queryset.filter(
+                key_filter(self.key, cursor, 'gt' if reverse else 'lt'))
+        return list(queryset[:self.per_page + 1])
+
+    def get_page(self, after=None, before=None):
+        before = self.parse_cursor(before)
+        if before is not None:
+            rows = self.keyset(before, reverse=True)
+            if len(rows) <= self.per_page:
+                return self.get_page()
+            self.has_previous = True
+            self.has_next = True
+            rows = rows[:self.per_page][::-1]
+        else:
+            after = self.parse_cursor(after)
+            rows = self.keyset(after)
+            self.has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            self.has_previous = after is not None
+        if rows:
+            self.previous_cursor = self.row_cursor(rows[0])
+            self.next_cursor = self.row_cursor(rows[-1])
+        else:
+            self.has_next = self.has_previous = False
+        return Page(rows, 1 + self.has_previous, self)
+
+
+def get_cursor(request, name):
+    try:
+        return int(request.GET[name])
+    except (KeyError, ValueError):
+        return None
 
 
 def add_paginator(request, posts):
-    paginator = Paginator(posts, settings.MAX_PAGE_AMOUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    if 'page' in request.GET:
+        paginator = Paginator(posts, settings.MAX_PAGE_AMOUNT)
+        return paginator.get_page(request.GET.get('page'))
+    paginator = KeysetPaginator(posts, settings.MAX_PAGE_AMOUNT)
+    return paginator.get_page(
+        after=get_cursor(request, 'after'),
+        before=get_cursor(request, 'before'),
+    )
+
+
+def time_cursor(moment, pk):
+    """Курсор по времени и id: время в микросекундах и id через дефис."""
+    microseconds = int(moment.timestamp()) * 10 ** 6 + moment.microsecond
+    return f'{microseconds}-{pk}'
+
+
+def comment_cursor(comment):
+    return time_cursor(comment.created, comment.pk)
+
+
+def parse_time_cursor(value):
+    try:
+        microseconds, pk = map(int, value.split('-'))
+        seconds, microsecond = divmod(microseconds, 10 ** 6)
+        created = datetime.fromtimestamp(seconds, timezone.utc).replace(
+            microsecond=microsecond)
+    except (AttributeError, ValueError, OverflowError, OSError):
+        return None
+    return created, pk
+
+
+def get_comments_page(post, after=None):
+    """Страница комментариев поста по курсору (created, id).
+
+    Комментарии идут от старых к новым по индексу (post, created).
+    Возвращает комментарии страницы и курсор следующей или None.
+    """
+    comments = post.comments.select_related('author').only(
+        'id', 'text', 'created', 'post_id', 'author__username')
+    cursor = parse_time_cursor(after)
+    if cursor is not None:
+        created, pk = cursor
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk))
+    per_page = settings.COMMENTS_PAGE_SIZE
+    rows = list(comments.order_by('created', 'pk')[:per_page + 1])
+    if len(rows) <= per_page:
+        return rows, None
+    return rows[:per_page], comment_cursor(rows[per_page - 1])
+
+
+def get_changes(queryset, since=None, limit=None):
+    """Пачка строк, измененных после курсора ``since``.
+
+    Возвращает строки и курсор для следующего запроса. Если строк
+    больше нет, курсор остается прежним, и клиент может повторять
+    запрос с ним, чтобы получать новые изменения.
+    """
+    cursor = parse_time_cursor(since)
+    if cursor is None:
+        since = None
+        rows = queryset.changed_since()
+    else:
+        rows = queryset.changed_since(*cursor)
+    if not limit or not 0 < limit <= settings.CHANGES_PAGE_SIZE:
+        limit = settings.CHANGES_PAGE_SIZE
+    rows = list(rows[:limit])
+    if rows:
+        since = time_cursor(
+            getattr(rows[-1], queryset.changes_field), rows[-1].pk)
+    return rows, since
@@ -1,39 +1,87 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.db.models import F
+from django.http import (Http404, HttpResponseBadRequest, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
 
+from .caching import cache_feed
+from .events import event_stream
+from .feed import backfill_feed, get_follow_feed, trim_feed
 from .forms import CommentForm, PostForm
+from .freshness import conditional, page_freshness, post_page_freshness
+from .hot import HotPaginator
 from .models import Follow, Group, Post
-from .utils import add_paginator
+from .recommendations import get_recommendations
+from .search import SearchPaginator
+from .thumbnails import enqueue_renditions, mark_pending
+from .utils import add_paginator, get_comments_page
 
 User = get_user_model()
 
 
-@cache_page(20, key_prefix='index_page')
+@conditional(page_freshness('index'))
+@cache_feed('index')
 def index(request):
-    posts = Post.objects.all()
+    posts = Post.objects.for_feed()
     page_obj = add_paginator(request, posts)
     context = {
         'page_obj': page_obj,
+        'events_enabled': settings.EVENTS_ENABLED,
     }
     return render(request, 'posts/index.html', context)
 
 
+@conditional(page_freshness('index', 'hot'))
+@cache_feed('index', 'hot')
+def hot(request):
+    paginator = HotPaginator(
+        Post.objects.for_feed('hot_score'), settings.MAX_PAGE_AMOUNT)
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/hot.html', context)
+
+
+@conditional(page_freshness('groups'))
+@cache_feed('groups')
+def group_index(request):
+    groups = Group.objects.select_related('stats').order_by(
+        F('stats__posts_count').desc(nulls_last=True), 'title')
+    context = {
+        'groups': groups,
+    }
+    return render(request, 'posts/groups.html', context)
+
+
+@conditional(page_freshness('group:{slug}'))
+@cache_feed('group:{slug}')
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts_of_group.all()
+    posts = group.posts_of_group.for_feed()
     page_obj = add_paginator(request, posts)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'events_enabled': settings.EVENTS_ENABLED,
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@conditional(page_freshness('profile:{username}', 'follow:{user.pk}'))
+@cache_feed('profile:{username}', 'follow:{user.pk}')
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts_of_author.all()
+    author = get_object_or_404(
+        User.objects.select_related('profile'),
+        username=username
+    )
+    posts = author.posts_of_author.for_feed()
     page_obj = add_paginator(request, posts)
     following = request.user.is_authenticated and request.user.follower.filter(
         author=author).exists()
@@ -41,22 +89,55 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'following': following,
+        'recommendations': get_recommendations(request.user),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional(post_page_freshness)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
+    comments, comments_next = get_comments_page(
+        post, request.GET.get('after'))
     context = {
         'post': post,
         'form': form,
         'comments': comments,
+        'comments_next': comments_next,
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    """Следующая страница комментариев HTML-фрагментом или JSON."""
+    post = get_object_or_404(Post.objects.only('id'), pk=post_id)
+    comments, comments_next = get_comments_page(
+        post, request.GET.get('after'))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'comments': [
+                {
+                    'id': comment.pk,
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                }
+                for comment in comments
+            ],
+            'next': comments_next,
+        })
+    context = {
+        'post': post,
+        'comments': comments,
+        'comments_next': comments_next,
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
     if request.method == 'POST':
@@ -64,7 +145,10 @@ def post_create(request):
         if form.is_valid():
             new_post = form.save(commit=False)
             new_post.author = request.user
-            new_post.save()
+            mark_pending(new_post, form)
+            with transaction.atomic():
+                new_post.save()
+                enqueue_renditions(new_post)
             return redirect('posts:profile', request.user.get_username())
         return render(request, 'posts/create_post.html', {'form': form})
     form = PostForm()
@@ -83,7 +167,11 @@ def post_edit(request, post_id):
     )
     if request.method == 'POST':
         if form.is_valid():
-            form.save()
+            post = form.save(commit=False)
+            mark_pending(post, form)
+            with transaction.atomic():
+                post.save()
+                enqueue_renditions(post)
             return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -101,17 +189,34 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(query, settings.MAX_PAGE_AMOUNT)
+    page_obj = paginator.get_page(
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+    )
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
+@conditional(page_freshness('index', 'follow:{user.pk}'))
 def follow_index(request):
-    user = request.user
-    posts = Post.objects.filter(author__following__user=user)
+    posts = get_follow_feed(request.user).for_feed()
     page_obj = add_paginator(request, posts)
     context = {
         'page_obj': page_obj,
+        'recommendations': get_recommendations(request.user),
+        'events_enabled': settings.EVENTS_ENABLED,
     }
     return render(request, 'posts/follow.html', context)
 
@@ -120,10 +225,13 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author != request.user:
-        Follow.objects.get_or_create(
-            author=author,
-            user=request.user
-        )
+        with transaction.atomic():
+            _, created = Follow.objects.get_or_create(
+                author=author,
+                user=request.user
+            )
+            if created and settings.FOLLOW_FEED_FANOUT:
+                backfill_feed(request.user, author)
     return redirect('posts:profile', username=username)
 
 
@@ -131,5 +239,50 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=user, author=author).delete()
+    with transaction.atomic():
+        Follow.objects.filter(user=user, author=author).delete()
+        if settings.FOLLOW_FEED_FANOUT:
+            trim_feed(user, author)
     return render(request, 'posts/follow.html')
+
+
+def events(request):
+    """Поток SSE о новых постах ленты ``feed``: index, follow или group.
+
+    Посты новее Last-Event-ID (или ``after`` при первом подключении)
+    отдаются сразу, чтобы не терять посты между переподключениями.
+    """
+    if not settings.EVENTS_ENABLED:
+        raise Http404
+    feed = request.GET.get('feed', 'index')
+    if feed == 'index':
+        channels = ['index']
+        posts = Post.objects.all()
+    elif feed == 'follow' and request.user.is_authenticated:
+        authors = request.user.follower.values_list('author_id', flat=True)
+        channels = [f'author:{author_id}' for author_id in authors]
+        posts = get_follow_feed(request.user)
+    elif feed == 'group' and 'slug' in request.GET:
+        channels = [f'group:{request.GET["slug"]}']
+        posts = Post.objects.filter(group__slug=request.GET['slug'])
+    else:
+        return HttpResponseBadRequest()
+    last_id = request.META.get('HTTP_LAST_EVENT_ID', '')
+    if not last_id.isdigit():
+        last_id = request.GET.get('after', '')
+    backlog = []
+    if last_id.isdigit():
+        backlog = [
+            {'id': pk, 'author': author_id, 'group': slug}
+            for pk, author_id, slug in posts.filter(id__gt=int(last_id))
+            .order_by('id')
+            .values_list('id', 'author_id', 'group__slug')
+            [:settings.MAX_PAGE_AMOUNT]
+        ]
+    response = StreamingHttpResponse(
+        event_stream(channels, backlog),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
-from django.contrib.auth.forms import UserCreationForm
+from django.contrib.auth.forms import PasswordResetForm, UserCreationForm
+
+from core.tasks import enqueue
 
 User = get_user_model()
 
@@ -7,3 +9,23 @@ User = get_user_model()
 class CreationForm(UserCreationForm):
     class Meta(UserCreationForm.Meta):
         fields = ('first_name', 'last_name', 'username', 'email')
+
+
+class QueuedPasswordResetForm(PasswordResetForm):
+    """Письмо отправляется задачей очереди.
+
+    В задачу передаются только id пользователя, адрес сайта и шаблоны:
+    токен и ссылка для сброса создаются при отправке и не хранятся в
+    таблице задач.
+    """
+
+    def send_mail(self, subject_template_name, email_template_name,
+                  context, from_email, to_email,
+                  html_email_template_name=None):
+        site = {
+            field: context[field]
+            for field in ('domain', 'site_name', 'protocol')
+        }
+        enqueue('users.send_password_reset', context['user'].pk, site,
+                subject_template_name, email_template_name, from_email,
+                html_email_template_name)
@@ -0,0 +1,39 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.core.mail import EmailMultiAlternatives
+from django.template import loader
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.tasks import task
+
+User = get_user_model()
+
+
+@task('users.send_password_reset', priority=10)
+def send_password_reset(user_id, site, subject_template_name,
+                        email_template_name, from_email,
+                        html_email_template_name=None):
+    """Письмо для сброса пароля. Токен создается здесь, а не в запросе,
+    чтобы ссылка для входа не хранилась в аргументах задачи."""
+    user = User.objects.filter(pk=user_id, is_active=True).first()
+    if user is None or not user.email:
+        return
+    context = {
+        **site,
+        'email': user.email,
+        'uid': urlsafe_base64_encode(force_bytes(user.pk)),
+        'user': user,
+        'token': default_token_generator.make_token(user),
+    }
+    subject = ''.join(
+        loader.render_to_string(subject_template_name, context).splitlines()
+    )
+    body = loader.render_to_string(email_template_name, context)
+    message = EmailMultiAlternatives(subject, body, from_email, [user.email])
+    if html_email_template_name is not None:
+        message.attach_alternative(
+            loader.render_to_string(html_email_template_name, context),
+            'text/html',
+        )
+    message.send()
@@ -1,4 +1,5 @@
 import os
+import sys
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -26,10 +27,12 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
 ]
 
 MIDDLEWARE = [
+    'core.perf.PerfMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -44,7 +47,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.perf.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -107,6 +110,10 @@ EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
 MAX_PAGE_AMOUNT = 10
 
+COMMENTS_PAGE_SIZE = 20
+
+CHANGES_PAGE_SIZE = 500
+
 LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -117,8 +124,159 @@ MEDIA_URL = '/media/'
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+# local - отдельный LocMemCache в каждом процессе;
+# shared - общий для процессов кэш в файле SQLite;
+# tiered - LocMemCache процесса перед общим кэшем для неизменяемых
+# записей (карточки постов и страницы лент с версией в ключе).
+# Версии и ETag живут в кэше часами, поэтому local годится только для
+# одного процесса: в остальных воркерах сброс версий не виден.
+CACHE_LAYOUT = os.getenv('YATUBE_CACHE_LAYOUT', 'tiered')
+
+CACHE_LAYOUTS = {
+    'local': {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    },
+    'shared': {
+        'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    },
+    'tiered': {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {
+                'LOCAL': 'local',
+                'SHARED': 'shared',
+                'LOCAL_KEY_PREFIXES': ('post_card:', 'feed_page:'),
+                'LOCAL_TIMEOUT': 60,
+            },
+        },
+        'local': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'tiered-local',
+        },
+        'shared': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        },
+    },
 }
+
+# Тесты не читают и не сбрасывают файл кэша сайта. Версии в кэше не
+# истекают, и записи, сохраненные для другой базы, ломали бы проверки.
+if sys.argv[1:2] == ['test'] or 'pytest' in sys.modules:
+    CACHE_LAYOUT = 'local'
+
+CACHES = CACHE_LAYOUTS[CACHE_LAYOUT]
+
+FOLLOW_FEED_FANOUT = True
+
+FOLLOW_FEED_FANOUT_LIMIT = 1000
+
+FOLLOW_FEED_BATCH_SIZE = 500
+
+# Рассылка поста автора с большим числом подписчиков уходит в очередь
+# задач, а не выполняется в запросе.
+FOLLOW_FEED_INLINE_FANOUT = 100
+
+FOLLOW_BULK_LIMIT = 100
+
+RECOMMENDATIONS_COUNT = 10
+
+RECOMMENDATIONS_BATCH_SIZE = 1000
+
+# Сколько соседей каждого узла графа учитывается при расчете оценок.
+RECOMMENDATIONS_SAMPLE = 50
+
+RECOMMENDATIONS_NEIGHBOURS = 20
+
+SEED_BATCH_SIZE = 5000
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+FEED_CACHE_TIMEOUT = 60 * 60
+
+FEED_CACHE_LOCK_TIMEOUT = 10
+
+FEED_CACHE_BETA = 1.0
+
+# sync - миниатюры создаются после сохранения поста в том же запросе;
+# queue - задачей очереди, для этого нужен запущенный manage.py
+# run_tasks, иначе пост показывает заглушку, пока задачу не выполнят;
+# None - лениво при первом показе (sorl).
+THUMBNAIL_PREGENERATE = 'sync'
+
+# Должны совпадать с параметрами тега {% thumbnail %} в шаблонах.
+THUMBNAIL_RENDITIONS = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+POST_IMAGE_MAX_UPLOAD_SIZE = 10 * 2 ** 20
+
+POST_IMAGE_MAX_PIXELS = 40 * 10 ** 6
+
+POST_IMAGE_MAX_SIDE = 1920
+
+POST_IMAGE_QUALITY = 85
+
+# fts5 - таблица SQLite FTS5; terms - переносимый индекс в SearchTerm;
+# None - FTS5, если таблица создана миграцией, иначе terms.
+SEARCH_BACKEND = None
+
+# Вклад поста и комментария в рейтинг «Обсуждаемое» убывает вдвое за
+# HOT_HALF_LIFE секунд.
+HOT_HALF_LIFE = 12 * 60 * 60
+
+HOT_POST_WEIGHT = 3
+
+HOT_COMMENT_WEIGHT = 1
+
+# Уведомления о новых постах (SSE). Каждый поток занимает воркер WSGI,
+# включать только с отдельным асинхронным сервером событий.
+EVENTS_ENABLED = False
+
+# Брокер уведомлений о новых постах из posts.events.BROKERS.
+EVENTS_BROKER = 'local'
+
+EVENTS_QUEUE_SIZE = 100
+
+EVENTS_KEEPALIVE = 15
+
+EVENTS_STREAM_TIMEOUT = 5 * 60
+
+EVENTS_RETRY_MS = 3000
+
+# Очередь задач core.tasks, воркеры запускает manage.py run_tasks.
+TASKS_WORKERS = 2
+
+TASKS_POLL_INTERVAL = 1
+
+TASKS_BATCH_SIZE = 100
+
+TASKS_MAX_ATTEMPTS = 5
+
+# Задержка перед повтором упавшей задачи удваивается с каждой попыткой.
+TASKS_RETRY_DELAY = 10
+
+# Задача воркера, не завершенная за это время, возвращается в очередь.
+TASKS_LOCK_TIMEOUT = 5 * 60
+
+# Сколько хранятся выполненные задачи и их ключи идемпотентности.
+TASKS_KEEP_DONE = 24 * 60 * 60
+
+# Сколько хранятся задачи, исчерпавшие попытки, с текстом ошибки.
+TASKS_KEEP_FAILED = 7 * 24 * 60 * 60
+
+# Доля запросов, которые замеряет core.perf.PerfMiddleware.
+PERF_SAMPLE_RATE = 0.05
+
+PERF_BUFFER_SIZE = 500
+
+PERF_VIEW_MODULES = ('posts.views',)
+
+PERF_EXCLUDE_PATHS = ('/static/', '/media/', '/debug/')